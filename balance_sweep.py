@@ -0,0 +1,190 @@
+"""Batch simulator for balancing GAME_SETTINGS and level files.
+
+Runs headless levels for every combination of settings overrides and every seed in a range,
+spread over a multiprocessing pool, and writes one aggregated row per combination.
+
+Run it from the game directory (assets are loaded relative to it). Example:
+    python balance_sweep.py --level 1 --seeds 0-199 --set level.boss.health=400,500,600 \
+        --set ENEMY_DROP_CHANCES.coin=0.2,0.3 --out sweep.csv
+"""
+import argparse
+import copy
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+# Workers simulate without a window or sound card; SDL must know before pygame is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import loser
+
+UPGRADE_ORDER = ['rapid_fire', 'shield_upgrade', 'bomb_gun']  # Order the autopilot buys upgrades in
+BASE_SETTINGS = loser.settings.as_dict()  # The defaults plus the settings file, if there is one
+
+
+class AutoPilotInput:
+    """Input source that plays the level like a simple player, so sweeps measure more than idling.
+
+    It drives under the nearest non-medic enemy, leads its shots, raises the shield when enemy
+    fire is close, and buys upgrades in UPGRADE_ORDER as soon as it can afford them.
+    """
+
+    def poll(self, session):
+        player = session.player
+        for upgrade_id in UPGRADE_ORDER:
+            if not player.upgrades[upgrade_id]:
+                loser.buy_upgrade(player, upgrade_id)
+                break
+
+        targets = [e for e in session.enemies if not e.kind.is_medic]
+        if not targets:
+            return loser.NullInput.IDLE
+        target = min(targets, key=lambda e: abs(e.x - player.x))
+
+        # Lead the shot by the time the bullet takes to reach the target
+        travel_ticks = math.hypot(target.x - player.x, target.y - player.y) / loser.settings.player_bullet_speed
+        aim_x = target.x + target.vx * travel_ticks
+        aim_y = target.y + target.vy * travel_ticks
+
+        danger = len(session.enemy_bullets.hits_in_rect(player.x - 60, player.y - 80, player.x + 60, player.y + 40)) > 0
+        return loser.TickInput(target.x < player.x - 20, target.x > player.x + 20,
+                               danger and player.shield_meter > 10, True, aim_x, aim_y)
+
+
+def apply_overrides(overrides, level):
+    """Installs BASE_SETTINGS and the level file with overrides given as {dotted.key: value} applied.
+
+    Keys starting with 'level.' change the level file's data instead of a setting, e.g. level.boss.health
+    or level.waves.0.count (list items are numbered from 0).
+    """
+    values = copy.deepcopy(BASE_SETTINGS)
+    with open(loser.LEVEL_FILE.format(level)) as f:
+        level_data = json.load(f)
+    for key, value in overrides.items():
+        if key.startswith('level.'):
+            settings, path = level_data, key.split('.')[1:]
+        else:
+            settings, path = values, key.split('.')
+        *parents, name = [int(part) if part.isdigit() else part for part in path]
+        for parent in parents:
+            settings = settings[parent]
+        if name not in (range(len(settings)) if isinstance(settings, list) else settings):
+            raise KeyError(f"Unknown setting: {key}")
+        settings[name] = value
+    loser.use_settings(loser.Settings(values, 'sweep overrides'))
+    loser.levels[level] = loser.Level(level, level_data)
+
+
+def run_one(job):
+    """Runs a single headless level; executed in a worker process."""
+    combo_index, overrides, level, seed, max_ticks = job
+    apply_overrides(overrides, level)
+    result = loser.run_headless(level, AutoPilotInput(), max_ticks=max_ticks, seed=seed)
+    spent = sum(loser.settings.upgrade_costs[upgrade_id] for upgrade_id in result['upgrades'])
+    result['coins_earned'] = result['coins'] + spent
+    result['combo'] = combo_index
+    return result
+
+
+def settings_grid(set_args, grid_file):
+    """Builds every combination of overrides from --set NAME=v1,v2 arguments and a JSON grid file."""
+    axes = {}
+    if grid_file:
+        with open(grid_file) as f:
+            axes.update(json.load(f))
+    for arg in set_args:
+        name, _, values = arg.partition('=')
+        axes[name] = [json.loads(value) for value in values.split(',')]
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def aggregate(combos, results):
+    """Reduces per-run results to one row of averages per settings combination."""
+    rows = []
+    for combo_index, overrides in enumerate(combos):
+        runs = [r for r in results if r['combo'] == combo_index]
+        boss_times = [r['time_to_boss'] / 1000 for r in runs if r['time_to_boss'] is not None]
+        row = dict(overrides)
+        row.update({
+            'runs': len(runs),
+            'win_rate': sum(r['outcome'] == 'won' for r in runs) / len(runs),
+            'timeout_rate': sum(r['outcome'] == 'timeout' for r in runs) / len(runs),
+            'boss_reached_rate': len(boss_times) / len(runs),
+            'mean_time_to_boss_s': sum(boss_times) / len(boss_times) if boss_times else None,
+            'mean_coins_earned': sum(r['coins_earned'] for r in runs) / len(runs),
+            'mean_damage_taken': sum(r['damage_taken'] for r in runs) / len(runs),
+            'mean_score': sum(r['score'] for r in runs) / len(runs),
+        })
+        rows.append(row)
+    return rows
+
+
+def write_table(rows, path):
+    """Writes rows as CSV, or as Parquet if the path ends in .parquet (needs pandas and pyarrow)."""
+    if path.endswith('.parquet'):
+        try:
+            import pandas
+        except ImportError:
+            sys.exit("Writing Parquet needs pandas and pyarrow installed; use a .csv path instead.")
+        pandas.DataFrame(rows).to_parquet(path)
+        return
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_seeds(text):
+    """Parses a seed range such as '0-999' (inclusive) or a single seed."""
+    first, _, last = text.partition('-')
+    return range(int(first), int(last or first) + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep GAME_SETTINGS overrides over many headless runs.")
+    parser.add_argument('--level', type=int, default=1)
+    parser.add_argument('--seeds', default='0-99', help="inclusive seed range, e.g. 0-999")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=V1,V2',
+                        help="values to sweep for a setting; nested keys use dots, e.g. ENEMY_DROP_CHANCES.coin, "
+                             "and level.KEY sets a value in the level file, e.g. level.boss.health")
+    parser.add_argument('--grid', help="JSON file mapping setting names to lists of values")
+    parser.add_argument('--ticks', type=int, default=loser.HEADLESS_MAX_TICKS, help="give up a run after this many ticks")
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default='sweep.csv', help="aggregated table (.csv or .parquet)")
+    parser.add_argument('--raw', help="also write every run's result to this table")
+    args = parser.parse_args()
+
+    combos = settings_grid(args.set, args.grid)
+    jobs = [(combo_index, overrides, args.level, seed, args.ticks)
+            for combo_index, overrides in enumerate(combos) for seed in parse_seeds(args.seeds)]
+
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Pool(args.processes) as pool:
+        for result in pool.imap_unordered(run_one, jobs, chunksize=max(1, len(jobs) // (args.processes * 8))):
+            results.append(result)
+            if len(results) % 100 == 0:
+                print(f"{len(results)}/{len(jobs)} runs", file=sys.stderr)
+        # Let the workers exit on their own: pygame makes them ignore the SIGTERM that terminate() sends
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+
+    write_table(aggregate(combos, results), args.out)
+    if args.raw:
+        raw_rows = [dict(combos[r['combo']], **{key: value for key, value in r.items() if key != 'upgrades'})
+                    for r in results]
+        write_table(raw_rows, args.raw)
+    print(f"{len(jobs)} runs of {len(combos)} settings combinations in {elapsed:.1f}s, written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Stress-scene benchmarks for the game loop.
+
+Builds synthetic scenes from the real game classes, runs the update, collision, draw and HUD
+phases of the loop separately over many frames under SDL's dummy drivers, and reports
+p50/p95/p99 times per phase. Results can be saved as a baseline and compared against later.
+
+Run it from the game directory (assets are loaded relative to it). Example:
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+# Benchmarks render offscreen; SDL must know before pygame is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+import loser
+
+LEVEL = 2  # Level the scenes are played on
+
+loser.load_level(LEVEL)  # Adds the level's background for load_all() to load
+loser.assets.load_all()  # Scenes are drawn with the real sprites, not the shapes drawn while assets load
+
+FRAME_BUDGET_MS = 1000 / 60
+PHASES = ['update', 'collision', 'draw', 'hud']
+ENEMY_TYPES = {
+    # type: (y, speed)
+    'helicopter': (150, 2),
+    'jet': (200, 3),
+    'tank': (loser.SCREEN_HEIGHT - 40, 1),
+    'medic_helicopter': (250, 3),
+}
+UNKILLABLE = 10 ** 9  # Enemy health in scenes, so the enemy count stays fixed
+
+
+class Scene:
+    """A synthetic game state that is topped back up to its target counts before every frame."""
+
+    def __init__(self, name, enemies=0, player_bullets=0, enemy_bullets=0, bombs=0, explosions=0, lasers=False,
+                 boss=False):
+        self.name = name
+        self.enemies = enemies
+        self.player_bullets = player_bullets
+        self.enemy_bullets = enemy_bullets
+        self.bombs = bombs
+        self.explosions = explosions
+        self.lasers = lasers
+        self.boss = boss
+
+    def build(self, seed):
+        self.rng = random.Random(seed)
+        self.clock = loser.GameClock(time_source=None)
+        self.session = loser.GameSession(LEVEL, self.clock, headless=True, seed=seed)
+        self.session.player.health = UNKILLABLE
+        if self.boss:
+            self.session.world.add_enemy(loser.Enemy(0, loser.ENEMY_TYPES['boss'], loser.SCREEN_WIDTH // 2,
+                                                     loser.SCREEN_HEIGHT // 4, 1, UNKILLABLE, 150, 150, True, 2,
+                                                     self.session.rng))
+        return self.session
+
+    def top_up(self):
+        """Restores the target number of each kind of entity (not timed)."""
+        session = self.session
+        world = session.world
+        rng = self.rng
+        now = self.clock.now
+        for name, (y, speed) in ENEMY_TYPES.items():
+            kind = loser.ENEMY_TYPES[name]
+            for _ in range(self.enemies - world.count(kind)):
+                world.add_enemy(loser.Enemy(now, kind, rng.uniform(0, loser.SCREEN_WIDTH), y, speed, UNKILLABLE,
+                                            *kind.size, not kind.is_medic, 2, session.rng))
+        for _ in range(self.player_bullets - len(session.bullets)):
+            session.bullets.spawn_aimed(rng.uniform(0, loser.SCREEN_WIDTH), rng.uniform(0, loser.SCREEN_HEIGHT),
+                                        rng.uniform(0, 2 * math.pi), 10, 10, is_bomb=rng.random() < 0.1)
+        bombs = int(np.count_nonzero(session.enemy_bullets.flags[:len(session.enemy_bullets)] &
+                                     loser.ProjectileStore.GRAVITY))
+        for _ in range(self.bombs - bombs):
+            session.enemy_bullets.spawn_bomb(rng.uniform(0, loser.SCREEN_WIDTH), rng.uniform(0, 300), 20)
+        for _ in range(self.enemy_bullets + self.bombs - len(session.enemy_bullets)):
+            session.enemy_bullets.spawn_aimed(rng.uniform(0, loser.SCREEN_WIDTH), rng.uniform(0, loser.SCREEN_HEIGHT),
+                                              rng.uniform(0, 2 * math.pi), 5, 5)
+        for _ in range(self.explosions - len(session.explosions)):
+            session.explosions.add(loser.explosion_pool.acquire(
+                now, rng.uniform(0, loser.SCREEN_WIDTH), rng.uniform(0, loser.SCREEN_HEIGHT),
+                rng.choice([20, 50, loser.settings.bomb_aoe])))
+        if self.lasers:
+            if not session.lasers:
+                session.lasers.add(loser.laser_pool.acquire(now, (400, 150), (rng.uniform(0, 800), 540)))
+            if not session.laser_warnings:
+                session.laser_warnings.add(loser.laser_warning_pool.acquire(now, (400, 150),
+                                                                            (rng.uniform(0, 800), 540)))
+
+
+SCENES = [
+    Scene('enemies', enemies=25),
+    Scene('player_bullets', enemies=5, player_bullets=1000),
+    Scene('enemy_bullets', enemies=5, enemy_bullets=1000),
+    Scene('explosions', enemies=5, explosions=60),
+    Scene('lasers', enemies=5, lasers=True),
+    Scene('boss_fight', boss=True, player_bullets=100, enemy_bullets=150, bombs=10, explosions=10, lasers=True),
+]
+
+
+def run_scene(scene, frames, warmup, seed):
+    """Runs a scene and returns the per-frame times in milliseconds for each phase and in total."""
+    session = scene.build(seed)
+    screen = loser.screen
+    timings = {phase: [] for phase in PHASES + ['frame']}
+    for frame in range(warmup + frames):
+        scene.top_up()
+        scene.clock.advance(loser.HEADLESS_TIMESTEP)
+        session.now = scene.clock.now
+
+        t0 = time.perf_counter()
+        session.boss_logic()
+        session.update_entities()
+        t1 = time.perf_counter()
+        session.check_collisions()
+        session.cleanup()
+        t2 = time.perf_counter()
+        session.draw_world(screen)
+        t3 = time.perf_counter()
+        session.draw_hud(screen)
+        t4 = time.perf_counter()
+
+        if frame >= warmup:
+            for phase, elapsed in zip(PHASES + ['frame'], (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+                timings[phase].append(elapsed * 1000)
+    session.close()
+    return timings
+
+
+def summarize(timings):
+    """Reduces per-frame times to p50/p95/p99 for each phase."""
+    return {phase: {f'p{q}': float(np.percentile(times, q)) for q in (50, 95, 99)} for phase, times in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game loop phases on synthetic stress scenes.")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scene', action='append', help="only run the named scene(s)")
+    parser.add_argument('--baseline', help="compare against results saved with --save-baseline")
+    parser.add_argument('--save-baseline', help="write this run's results to a JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="allowed slowdown of a frame percentile against the baseline (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    scenes = [scene for scene in SCENES if not args.scene or scene.name in args.scene]
+    results = {}
+    for scene in scenes:
+        results[scene.name] = summarize(run_scene(scene, args.frames, args.warmup, args.seed))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failed = False
+    print(f"{'scene':<16}{'phase':<11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, phases in results.items():
+        for phase, stats in phases.items():
+            line = f"{name:<16}{phase:<11}" + ''.join(f"{stats[q]:>9.3f}" for q in ('p50', 'p95', 'p99'))
+            if phase == 'frame':
+                if stats['p99'] > FRAME_BUDGET_MS:
+                    line += "  over 60 FPS budget"
+                    failed = True
+                if baseline and name in baseline:
+                    old = baseline[name]['frame']
+                    changes = {q: stats[q] / old[q] - 1 for q in ('p50', 'p95', 'p99') if old[q] > 0}
+                    line += "  vs baseline " + ' '.join(f"{q} {change:+.0%}" for q, change in changes.items())
+                    if any(change > args.tolerance for change in changes.values()):
+                        line += "  REGRESSION"
+                        failed = True
+            print(line)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,35 @@
 
-import pygame
+import argparse
+import cProfile
+import copy
+import hashlib
+import heapq
+import io
+import json
 import math
+import os
+import queue
 import random
+import struct
 import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+STARTUP_TIME = time.perf_counter()  # Start-up reference for timing the first frame and asset loading
+
+import numpy as np
+
+# Headless runs simulate levels without a window or sound card, so SDL must use its dummy
+# drivers; this has to be set before pygame is initialized.
+HEADLESS = '--headless' in sys.argv
+if HEADLESS:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import pygame
 
 # --- Pygame Initialization ---
 try:
@@ -24,17 +51,18 @@ def draw_entity_with_direction(screen, image, rect, direction):
 # --- Global Game State ---
 unlocked_levels = {1}
 current_level_number = 1
-boss_active = False
-enemies_destroyed_in_level = 0
-total_enemies_for_level = 0
-boss_attack_timer = 0
-current_boss_attack = 'bullets'
 background_music_enabled = True  # New global state for music
 menu_music_playing = False  # New global state for menu music
+recording_path = "last_session.replay"  # Each played level's input is recorded here (--record); None turns it off
+first_frame_time = None  # Seconds from start-up until the main menu's first frame was shown
+startup_report = False  # Print start-up timings after the first frame and exit (--startup-time)
 
 # --- Game Constants and Settings (Easily Changeable) ---
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
+SIM_TIMESTEP = 1000 / 60  # ms of game time per simulation tick; speeds in GAME_SETTINGS are per tick
+HEADLESS_TIMESTEP = SIM_TIMESTEP  # ms of game time per headless simulation tick
+HEADLESS_MAX_TICKS = 60 * 60 * 10  # Headless runs give up after ten minutes of game time
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (239, 68, 68)
@@ -49,16 +77,36 @@ MEDIC_COLOR = (255, 255, 255)  # White color for medic helicopter
 LASER_COLOR = (255, 0, 0, 150)  # Red with some transparency
 WARNING_COLOR = (255, 255, 0, 150)  # Yellow warning color with transparency
 
+# Defaults; a settings file can override any of them (see Settings below). The game reads them
+# through the compiled `settings` object, never from this dict.
 GAME_SETTINGS = {
     'PLAYER_SPEED': 5,
     'PLAYER_HEALTH': 100,
     'SHIELD_METER_MAX': 100,
-    'SHIELD_DRAIN_RATE': 0.15,  # Shield meter drains per frame
+    'SHIELD_DRAIN_RATE': 0.15,  # Shield meter drains per simulation tick
     'SHIELD_REFILL_ON_PICKUP': 20,  # %
     'PLAYER_BULLET_SPEED': 10,
     'PLAYER_BULLET_DAMAGE': 10,
     'BOMB_BULLET_DAMAGE': 50,
     'BOMB_AOE': 150,
+    'CANNON_ROTATION_STEPS': 180,  # Pre-rotated cannon angles; more steps are smoother but use more memory
+    'EXPLOSION_FRAMES': 15,  # Pre-rendered frames per explosion animation
+    'SHIELD_ALPHA_STEPS': 32,  # Pre-rendered shield rings, one per alpha step
+    'TEXT_CACHE_SIZE': 256,  # Rendered text surfaces kept before the least recently used is dropped
+    'SPATIAL_CELL_SIZE': 100,  # px, grid cell size of the collision spatial hash
+    'POOL_CAPACITY': 256,  # Max recycled objects kept per pool (explosions, drops, lasers, warnings)
+    'ATLAS_WIDTH': 512,  # px, width of the packed sprite atlas
+    'ATLAS_MAX_SPRITE': 128,  # px, scaled sprites up to this size on both sides are packed into the atlas
+    'RENDER_FPS_CAP': 60,  # Frames drawn per second at most, 0 for no limit; the simulation always ticks at 60 Hz
+    'VSYNC': False,  # Wait for the display's refresh when presenting a frame; turns off RENDER_FPS_CAP unless it is set too
+    'GAME_SPEED': 1.0,  # Game time per real time: below 1 for slow motion, above 1 for fast-forward
+    'MAX_CATCH_UP_TICKS': 5,  # Ticks simulated per frame at most; a slower machine runs in slow motion instead of stalling
+    'THREADED_SIMULATION': False,  # Simulate on a background thread while the main thread draws (for multi-core machines)
+    'DIRTY_RECT_RENDERING': False,  # Only redraw and push changed areas; faster on software-rendered displays
+    'PROFILER_HISTORY': 240,  # Frames shown in the profiler overlay's frame-time graph
+    'PROFILER_REFRESH_MS': 250,  # How often the profiler overlay is redrawn
+    'PROFILER_CAPTURE_FRAMES': 300,  # Frames recorded by a cProfile capture
+    'SETTINGS_RELOAD_MS': 500,  # How often a running level checks the settings file for changes, 0 to never reload
     'RAPID_FIRE_RATE': 100,
     'STANDARD_FIRE_RATE': 200,
     'ENEMY_BULLET_SPEED': 5,
@@ -69,14 +117,7 @@ GAME_SETTINGS = {
     'BOSS_LASER_DAMAGE': 10,  # Damage per hit if not shielded
     'BOSS_LASER_SHIELD_DRAIN': 2,  # Shield damage per hit
     'LASER_WARNING_DURATION': 1000,  # ms, how long the warning sign is visible before the laser fires
-    'ENEMY_AIR_SPAWN_RATE': 2000,
-    'ENEMY_GROUND_SPAWN_RATE': 20000,
-    'MEDIC_SPAWN_RATE': 19000,  # Medic helicopter spawns
-    'MAX_ENEMIES_ON_SCREEN': 5,
-    'LEVEL_1_TOTAL_ENEMIES': 20,
-    'LEVEL_2_TOTAL_ENEMIES': 30,
-    'BOSS_HEALTH_L1': 500,
-    'BOSS_HEALTH_L2': 1000,
+    'MAX_ENEMIES_ON_SCREEN': 5,  # Regular enemies on screen at once, unless a level file sets its own
     'ENEMY_DROP_CHANCES': {
         'coin': 0.3,  # 30% chance for a coin
         'shield': 0.1  # 10% chance for a shield pickup
@@ -101,156 +142,944 @@ GAME_SETTINGS = {
         'rapid_fire': 100,
         'shield_upgrade': 100,
         'bomb_gun': 200
+    },
+    'SOUND_CHANNELS': {  # Mixer channels reserved per sound category, i.e. its max concurrent voices
+        'weapons': 2,
+        'explosions': 4,
+        'pickups': 1,
+        'ui': 1
     }
 }
 
+
+# --- Settings ---
+SETTINGS_FILE = "settings.json"  # Optional JSON object overriding GAME_SETTINGS; reloaded while a level runs
+settings_overrides = {}  # Set by command-line flags; applied over the settings file every time it is loaded
+# Smallest allowed values of the settings that are counts, sizes or divisors, where a 0 would
+# crash or stall the game; for a nested table the minimum applies to each of its values
+SETTING_MINIMUMS = {
+    'SHIELD_METER_MAX': 1,
+    'PLAYER_BULLET_SPEED': 1,
+    'ENEMY_BULLET_SPEED': 1,
+    'CANNON_ROTATION_STEPS': 1,
+    'EXPLOSION_FRAMES': 1,
+    'SHIELD_ALPHA_STEPS': 1,
+    'TEXT_CACHE_SIZE': 1,
+    'SPATIAL_CELL_SIZE': 1,
+    'ATLAS_WIDTH': 1,
+    'MAX_CATCH_UP_TICKS': 1,
+    'PROFILER_HISTORY': 1,
+    'PROFILER_CAPTURE_FRAMES': 1,
+    'MAX_ENEMIES_ON_SCREEN': 1,
+    'SOUND_CHANNELS': 1,
+    'GAME_SPEED': 0.1,
+}
+
+
+def merge_settings(defaults, overrides, source, prefix=''):
+    """Returns a copy of defaults with overrides applied, after checking every override.
+
+    Overrides must use known keys and the type of the default (an int is fine for a float), can't
+    be negative unless the default is or below their SETTING_MINIMUMS entry, and may give just
+    some of the keys of a nested table.
+    """
+    if not isinstance(overrides, dict):
+        raise ValueError(f"{source}: {prefix.rstrip('.') or 'settings'} must be a JSON object")
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        name = prefix + key
+        if key not in defaults:
+            raise ValueError(f"{source}: unknown setting {name}")
+        default = defaults[key]
+        if isinstance(default, dict):
+            value = merge_settings(default, value, source, name + '.')
+        elif not (type(value) is type(default) or isinstance(default, float) and type(value) is int):
+            raise ValueError(f"{source}: {name} must be of type {type(default).__name__}, not {value!r}")
+        elif value < 0 <= default:
+            raise ValueError(f"{source}: {name} can't be negative")
+        else:
+            minimum = SETTING_MINIMUMS.get(name.partition('.')[0])
+            if minimum is not None and value < minimum:
+                raise ValueError(f"{source}: {name} must be at least {minimum}")
+        merged[key] = value
+    return merged
+
+
+class Settings:
+    """GAME_SETTINGS compiled into a read-only object, validated once when it is built.
+
+    Each setting is an attribute named in lower case (settings.bomb_aoe) kept in a slot, so reading
+    one costs no dict lookup; nested tables such as SCORES become read-only mappings. Settings
+    objects never change: new settings are built as a new object and swapped in by use_settings().
+    """
+
+    __slots__ = tuple(key.lower() for key in GAME_SETTINGS)
+
+    def __init__(self, overrides=None, source='settings'):
+        for key, value in merge_settings(GAME_SETTINGS, overrides or {}, source).items():
+            object.__setattr__(self, key.lower(), MappingProxyType(value) if isinstance(value, dict) else value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read-only; build new Settings and pass them to use_settings()")
+
+    def __delattr__(self, name):
+        raise AttributeError("Settings are read-only")
+
+    def as_dict(self):
+        """Returns the settings as a plain dict shaped like GAME_SETTINGS."""
+        values = {}
+        for key in GAME_SETTINGS:
+            value = getattr(self, key.lower())
+            values[key] = dict(value) if isinstance(value, MappingProxyType) else value
+        return values
+
+
+settings_file_mtimes = {}  # Settings file path -> its modification time when load_settings last read it
+
+
+def file_mtime(path):
+    """Returns a file's modification time, or None if there is no such file."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Builds Settings from the defaults, the settings file (if there is one) and settings_overrides."""
+    # Taken before reading, so a save that lands while the file is read is picked up by the next check
+    settings_file_mtimes[path] = file_mtime(path)
+    overrides = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            try:
+                overrides = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}") from None
+        if not isinstance(overrides, dict):
+            raise ValueError(f"{path}: settings must be a JSON object")
+    overrides = {**overrides, **settings_overrides}
+    if overrides.get('VSYNC') is True and 'RENDER_FPS_CAP' not in overrides:
+        # Presenting a frame waits for the display, so that sets the frame rate instead of a cap
+        overrides['RENDER_FPS_CAP'] = 0
+    return Settings(overrides, path)
+
+
+def use_settings(new_settings):
+    """Makes new_settings the current settings and updates the values derived from them."""
+    global settings
+    settings = new_settings
+    configure_enemy_types()
+
+
+class SettingsWatcher:
+    """Watches the settings file while a level runs, so it can be tuned without restarting.
+
+    poll() is called between ticks. At most every SETTINGS_RELOAD_MS it checks the file's
+    modification time, and if the file changed since the settings were last loaded from it (at
+    start-up, say, before the menu was shown) it returns the reloaded Settings (otherwise None).
+    A file that fails to load is reported and the current settings stay in use. Settings that are
+    only read at start-up, such as cache sizes and VSYNC, still need a restart.
+    """
+
+    def __init__(self, path=SETTINGS_FILE):
+        self.path = path
+        self.interval = settings.settings_reload_ms / 1000
+        self.next_check = time.perf_counter() + self.interval
+        self.mtime = settings_file_mtimes.get(path)
+
+    def poll(self):
+        now = time.perf_counter()
+        if not self.interval or now < self.next_check:
+            return None
+        self.next_check = now + self.interval
+        mtime = file_mtime(self.path)
+        if mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        try:
+            new_settings = load_settings(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Kept the current settings: {e}")
+            return None
+        old, new = settings.as_dict(), new_settings.as_dict()
+        print(f"Reloaded {self.path}: {', '.join(key for key in new if new[key] != old[key]) or 'no changes'}")
+        return new_settings
+
+
+try:
+    settings = load_settings()
+except ValueError as e:
+    sys.exit(f"Invalid settings: {e}")
+
 # --- Screen Setup ---
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+def open_window():
+    """Creates (or re-creates) the game window, synced to the display's refresh rate if VSYNC is set."""
+    if settings.vsync:
+        try:
+            return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+        except pygame.error as e:
+            print(f"VSync is not available, drawing without it: {e}")
+    return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+
+screen = open_window()
 pygame.display.set_caption("Loser")  # Changed title here
 clock = pygame.time.Clock()
+
+# --- Fonts and Text Cache ---
+fonts = {}  # Default font objects keyed by size
+
+
+def get_font(size):
+    """Returns the default font at the given size, creating it only the first time."""
+    if size not in fonts:
+        fonts[size] = pygame.font.Font(None, size)
+    return fonts[size]
+
+
+class TextCache:
+    """Least recently used cache of rendered text surfaces keyed by (text, font, color)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, font, color):
+        """Returns the rendered text, only calling font.render when it isn't cached."""
+        key = (text, font, color)
+        text_surface = self.surfaces.get(key)
+        if text_surface is None:
+            self.misses += 1
+            text_surface = font.render(text, True, color)
+            self.surfaces[key] = text_surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        return text_surface
+
+    def stats(self):
+        """Returns the hit/miss counters and the number of cached text surfaces."""
+        return {'hits': self.hits, 'misses': self.misses, 'surfaces': len(self.surfaces)}
+
+
+text_cache = TextCache(settings.text_cache_size)
 FONT_SIZE = 18
-font = pygame.font.Font(None, FONT_SIZE)
-large_font = pygame.font.Font(None, 40)
-hud_font = pygame.font.Font(None, 24)
+font = get_font(FONT_SIZE)
+large_font = get_font(40)
+hud_font = get_font(24)
 
 # --- Asset Loading ---
 
-try:
-    # Player and Enemies
-    player_image = pygame.image.load("player_tank.png").convert_alpha()
-    player_cannon_image = pygame.image.load("player_cannon.png").convert_alpha()
-    enemy_helicopter_image = pygame.image.load("enemy_helicopter.png").convert_alpha()
-    enemy_jet_image = pygame.image.load("enemy_jet.png").convert_alpha()
-    enemy_tank_image = pygame.image.load("enemy_tank.png").convert_alpha()
-    boss_image = pygame.image.load("boss.png").convert_alpha()
-    medic_helicopter_image = pygame.image.load("medic_helicopter.png").convert_alpha()
-
-    # Pickups
-    coin_image = pygame.image.load("coin.png").convert_alpha()
-    shield_pickup_image = pygame.image.load("shield_pickup.png").convert_alpha()
-
-    # Special effects & bullets
-    player_bullet_image = pygame.image.load("player_bullet.png").convert_alpha()
-    bomb_bullet_image = pygame.image.load("bomb_bullet.png").convert_alpha()
-    enemy_bullet_image = pygame.image.load("enemy_bullet.png").convert_alpha()
-    explosion_image = pygame.image.load("explosion.png").convert_alpha()
-
-    # Backgrounds - New assets
-    menu_bg_image = pygame.image.load("menu_bg.png").convert()
-    level1_bg_image = pygame.image.load("level1_bg.png").convert()
-    level2_bg_image = pygame.image.load("level2_bg.png").convert()
-
-    # Sound effects
-    player_fire_sfx = pygame.mixer.Sound("player_fire.wav")
-    enemy_explosion_sfx = pygame.mixer.Sound("enemy_explosion.wav")
-    pickup_sfx = pygame.mixer.Sound("pickup.wav")
-    game_over_sfx = pygame.mixer.Sound("game_over.wav")
-
-    # Music - New assets
-    menu_music = "menu_music.mp3"
-    level1_music = "level1_music.mp3"
-    level2_music = "level2_music.mp3"
+# Every image, sound and music file, grouped by when it is first needed and keyed by the module
+# global it is stored in. Only the menu group is loaded before the first frame; AssetManager
+# decodes the rest on a background thread while the menu is showing. Each level adds a group of
+# its own, named after it, for the background and music its level file names (see Level).
+ASSET_GROUPS = {
+    'menu': {
+        'menu_bg_image': "menu_bg.png",
+        'menu_music': "menu_music.mp3",
+    },
+    'sprites': {
+        # Player and Enemies
+        'player_image': "player_tank.png",
+        'player_cannon_image': "player_cannon.png",
+        'enemy_helicopter_image': "enemy_helicopter.png",
+        'enemy_jet_image': "enemy_jet.png",
+        'enemy_tank_image': "enemy_tank.png",
+        'boss_image': "boss.png",
+        'medic_helicopter_image': "medic_helicopter.png",
+        # Pickups
+        'coin_image': "coin.png",
+        'shield_pickup_image': "shield_pickup.png",
+        # Special effects & bullets
+        'player_bullet_image': "player_bullet.png",
+        'bomb_bullet_image': "bomb_bullet.png",
+        'enemy_bullet_image': "enemy_bullet.png",
+        'explosion_image': "explosion.png",
+        # Sound effects
+        'player_fire_sfx': "player_fire.wav",
+        'enemy_explosion_sfx': "enemy_explosion.wav",
+        'pickup_sfx': "pickup.wav",
+        'game_over_sfx': "game_over.wav",
+    },
+}
 
-except pygame.error as e:
-    print(f"Error loading an asset: {e}")
-    # Handle the error by falling back to drawing shapes
-    player_image = None
-    player_cannon_image = None
-    enemy_helicopter_image = None
-    enemy_jet_image = None
-    enemy_tank_image = None
-    boss_image = None
-    medic_helicopter_image = None
-    coin_image = None
-    shield_pickup_image = None
-    player_bullet_image = None
-    bomb_bullet_image = None
-    enemy_bullet_image = None
-    explosion_image = None
-    menu_bg_image = None
-    level1_bg_image = None
-    level2_bg_image = None
-    player_fire_sfx = None
-    enemy_explosion_sfx = None
-    pickup_sfx = None
-    game_over_sfx = None
-    menu_music = None
-    level1_music = None
-    level2_music = None
+# Assets are None until their group has loaded (or if they failed to), and the game falls back
+# to drawing shapes and staying silent for anything that is None
+player_image = None
+player_cannon_image = None
+enemy_helicopter_image = None
+enemy_jet_image = None
+enemy_tank_image = None
+boss_image = None
+medic_helicopter_image = None
+coin_image = None
+shield_pickup_image = None
+player_bullet_image = None
+bomb_bullet_image = None
+enemy_bullet_image = None
+explosion_image = None
+menu_bg_image = None
+player_fire_sfx = None
+enemy_explosion_sfx = None
+pickup_sfx = None
+game_over_sfx = None
+menu_music = None
+
+
+# A PNG read by the loader thread: its path, content hash and the decoded surface, which is None if
+# a byte-identical file was already decoded and its converted surface can be reused.
+DecodedImage = namedtuple('DecodedImage', ['path', 'digest', 'surface'])
+
+
+class AssetManager:
+    """Loads the game's assets group by group, decoding files on a background thread.
+
+    start() decodes every group that isn't loaded yet on a worker thread, in ASSET_GROUPS order
+    followed by groups added with add_group(); prefetch() moves a group to the front of the queue.
+    Decoding touches neither the display nor game state, so the worker hands decoded files back to
+    the main thread, which converts them for the display, stores them in the module globals and
+    runs the group's on_loaded callbacks (so caches and atlases are built) whenever poll() or
+    wait() is called. wait() loads a group the worker hasn't started on right away on the calling
+    thread.
+
+    Images are deduplicated by a hash of their file contents, so byte-identical files (such as two
+    level backgrounds) are decoded, converted and kept in memory only once. Only the converted
+    surface is kept; the decoded one is dropped as soon as it has been converted.
+    """
+
+    def __init__(self, groups, namespace):
+        self.groups = groups
+        self.namespace = namespace
+        self.pending = list(groups)  # Groups nobody has started loading, in load order
+        self.loaded = set()
+        self.load_times = {}  # Seconds from start-up until each group was ready
+        self.callbacks = {}
+        self.digests = set()  # Content hashes of every image decoded so far, on either thread
+        self.images = {}  # Display-format images by content hash
+        self.duplicates = 0
+        self.decoded = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def on_loaded(self, group, callback):
+        """Calls callback() on the main thread once the group's assets are in place."""
+        self.callbacks.setdefault(group, []).append(callback)
+
+    def add_group(self, group, files):
+        """Adds a group of {global name: file} to load after the others; returns False if it exists.
+
+        Its globals are None until it has loaded, like every other asset.
+        """
+        with self.lock:
+            if group in self.groups:
+                return False
+            self.groups[group] = files
+            self.pending.append(group)
+        for name in files:
+            self.namespace.setdefault(name, None)
+        return True
+
+    def start(self):
+        """Starts decoding the remaining groups in the background, again if the worker ran out of them."""
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.work, name="asset-loader", daemon=True)
+            self.thread.start()
+
+    def prefetch(self, group):
+        """Makes a group the next one the worker decodes."""
+        with self.lock:
+            if group in self.pending:
+                self.pending.remove(group)
+                self.pending.insert(0, group)
+
+    def work(self):
+        """Worker thread: decodes pending groups until none are left."""
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+                group = self.pending.pop(0)
+            try:
+                values = self.decode_group(group)
+            except Exception as e:
+                # Hand the error over so the main thread raises it instead of waiting for this group
+                self.decoded.put((group, e))
+                return
+            self.decoded.put((group, values))
+
+    def decode_group(self, group):
+        """Reads every file of a group; safe to run off the main thread."""
+        values = {}
+        for name, path in self.groups[group].items():
+            try:
+                if path.endswith('.png'):
+                    values[name] = self.decode_image(path)
+                elif path.endswith('.wav'):
+                    values[name] = pygame.mixer.Sound(path)
+                else:
+                    # Music is streamed from disk when it plays, so only check that it is there
+                    values[name] = path if os.path.exists(path) else None
+            except (pygame.error, OSError) as e:
+                print(f"Error loading an asset: {e}")
+                values[name] = None
+        return values
+
+    def decode_image(self, path):
+        """Decodes a PNG, skipping the decoding if a byte-identical file has already been decoded."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            if digest in self.digests:
+                return DecodedImage(path, digest, None)
+        surface = pygame.image.load(io.BytesIO(data), path)
+        with self.lock:
+            self.digests.add(digest)
+        return DecodedImage(path, digest, surface)
+
+    def finish_group(self, group, values):
+        """Converts a decoded group for the display and makes it visible to the game."""
+        for name, value in values.items():
+            if isinstance(value, DecodedImage):
+                with self.lock:
+                    image = self.images.get(value.digest)
+                if image is None:
+                    surface = value.surface
+                    if surface is None:
+                        # The copy was decoded on the other thread and its group isn't finished yet
+                        surface = pygame.image.load(value.path)
+                    # Backgrounds have no transparency, so they blit faster without an alpha channel
+                    image = surface.convert() if name.endswith('_bg_image') else surface.convert_alpha()
+                    with self.lock:
+                        self.images[value.digest] = image
+                else:
+                    self.duplicates += 1  # Loaded before, or earlier in this same batch
+                value = image
+            self.namespace[name] = value
+        self.loaded.add(group)
+        self.load_times[group] = time.perf_counter() - STARTUP_TIME
+        for callback in self.callbacks.get(group, ()):
+            callback()
+
+    def poll(self, block=False):
+        """Finishes the groups the worker has decoded so far; with block=True waits for at least one.
+
+        An unexpected error that stopped the worker is raised here, on the main thread.
+        """
+        while True:
+            try:
+                group, values = self.decoded.get(block=block)
+            except queue.Empty:
+                return
+            if isinstance(values, Exception):
+                raise values
+            self.finish_group(group, values)
+            block = False
+
+    def wait(self, group):
+        """Returns once a group is loaded, loading it on this thread if the worker hasn't started on it."""
+        with self.lock:
+            load_here = group in self.pending
+            if load_here:
+                self.pending.remove(group)
+        if load_here:
+            self.finish_group(group, self.decode_group(group))
+        while group not in self.loaded:
+            self.poll(block=True)
+
+    def load_all(self):
+        """Loads every group, for tools that draw without going through the menu."""
+        for group in self.groups:
+            self.wait(group)
+
+    def stats(self):
+        """Returns the number of loaded groups, unique decoded images and duplicate files skipped."""
+        return {'groups': len(self.loaded), 'images': len(self.images), 'duplicates': self.duplicates}
+
+
+assets = AssetManager(ASSET_GROUPS, globals())
+
+
+# --- Sprite Cache ---
+
+class SpriteCache:
+    """Holds pre-scaled copies of sprite images so draw calls never rescale per frame."""
+
+    def __init__(self):
+        self.sprites = {}
+        self.hits = 0
+        self.misses = 0
+
+    def preload(self, image, size):
+        """Scales an image to the given size ahead of time."""
+        if image is not None and (image, size) not in self.sprites:
+            self.sprites[(image, size)] = pygame.transform.scale(image, size)
+
+    def get(self, image, size):
+        """Returns the image scaled to size, scaling and storing it on a miss."""
+        key = (image, size)
+        scaled_image = self.sprites.get(key)
+        if scaled_image is None:
+            self.misses += 1
+            scaled_image = pygame.transform.scale(image, size)
+            self.sprites[key] = scaled_image
+        else:
+            self.hits += 1
+        return scaled_image
+
+    def pack(self, atlas, max_size):
+        """Moves every cached sprite no bigger than max_size on either side into the atlas."""
+        small = {key: sprite for key, sprite in self.sprites.items()
+                 if sprite.get_width() <= max_size and sprite.get_height() <= max_size}
+        self.sprites.update(atlas.pack(small))
+
+    def stats(self):
+        """Returns the hit/miss counters and the number of cached sprites."""
+        return {'hits': self.hits, 'misses': self.misses, 'sprites': len(self.sprites)}
+
+
+class SpriteAtlas:
+    """Packs small sprites into one surface and hands out subsurface views of it.
+
+    Sprites are placed left to right on shelves as tall as the tallest sprite on them, tallest
+    first. The manifest maps each sprite's key to its rect in the atlas surface, so draws can
+    also blit areas of the one atlas surface directly.
+    """
+
+    PADDING = 1  # px between sprites, so no sprite picks up a neighbour's edge pixels
+
+    def __init__(self, width):
+        self.width = width
+        self.surface = None
+        self.manifest = {}
+
+    def pack(self, sprites):
+        """Packs a {key: surface} dict into the atlas and returns {key: subsurface view}.
+
+        Sprites wider than the atlas are left out, so the caller keeps using them as they are.
+        """
+        x = y = shelf_height = 0
+        for key, sprite in sorted(sprites.items(), key=lambda item: -item[1].get_height()):
+            w, h = sprite.get_size()
+            if w > self.width:
+                continue
+            if x + w > self.width:
+                x = 0
+                y += shelf_height + self.PADDING
+                shelf_height = 0
+            self.manifest[key] = pygame.Rect(x, y, w, h)
+            x += w + self.PADDING
+            shelf_height = max(shelf_height, h)
+
+        self.surface = pygame.Surface((self.width, y + shelf_height), pygame.SRCALPHA).convert_alpha()
+        self.surface.fill((0, 0, 0, 0))
+        views = {}
+        for key, rect in self.manifest.items():
+            # BLEND_RGBA_MAX onto the cleared atlas copies pixels and alpha exactly instead of blending them
+            self.surface.blit(sprites[key], rect, special_flags=pygame.BLEND_RGBA_MAX)
+            views[key] = self.surface.subsurface(rect)
+        return views
+
+    def stats(self):
+        """Returns the number of packed sprites and the atlas size."""
+        size = self.surface.get_size() if self.surface else (0, 0)
+        return {'sprites': len(self.manifest), 'width': size[0], 'height': size[1]}
+
+
+class RotationAtlas:
+    """Holds copies of an image pre-rotated into evenly spaced angle buckets."""
+
+    def __init__(self, image, steps):
+        self.steps = steps
+        self.step_degrees = 360 / steps
+        self.frames = [pygame.transform.rotate(image, i * self.step_degrees) for i in range(steps)]
+
+    def get(self, degrees):
+        """Returns the pre-rotated frame nearest to the given angle in degrees."""
+        return self.frames[round(degrees / self.step_degrees) % self.steps]
+
+
+class ExplosionFrames:
+    """Bakes each explosion size into a short frame sequence indexed by animation progress."""
+
+    def __init__(self, frame_count):
+        self.frame_count = frame_count
+        self.sequences = {}
+
+    def bake(self, size, color):
+        """Renders the growing, fading frames for one explosion size."""
+        frames = []
+        for i in range(self.frame_count):
+            progress = i / self.frame_count
+            current_radius = int(size * (progress + 0.1))  # Start from a small size
+            alpha = 255 - int(255 * progress)
+            if explosion_image:
+                frame = pygame.transform.scale(explosion_image, (current_radius * 2, current_radius * 2))
+                frame.set_alpha(alpha)
+            else:
+                # Fallback to drawing a shape
+                frame = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+                pygame.draw.circle(frame, color + (alpha,), (size, size), current_radius)
+            frames.append(frame)
+        self.sequences[(size, color)] = frames
+        return frames
+
+    def get(self, size, color, progress):
+        """Returns the frame to show at the given progress (0 to 1) of the animation."""
+        frames = self.sequences.get((size, color))
+        if frames is None:
+            frames = self.bake(size, color)
+        return frames[min(int(progress * self.frame_count), self.frame_count - 1)]
+
+
+class OverlayRenderer:
+    """Draws translucent effects into surfaces sized to their bounding box instead of the whole screen."""
+
+    def __init__(self, shield_alpha_steps):
+        self.shield_alpha_steps = shield_alpha_steps
+        self.shield_rings = {}
+
+    def line_overlay(self, color, start_pos, end_pos, width):
+        """Renders a translucent line into a surface just big enough to hold it.
+
+        Returns the surface and the screen position to blit it at, so the caller can keep
+        both and blit them again on later frames.
+        """
+        left = int(min(start_pos[0], end_pos[0])) - width
+        top = int(min(start_pos[1], end_pos[1])) - width
+        right = int(max(start_pos[0], end_pos[0])) + width
+        bottom = int(max(start_pos[1], end_pos[1])) + width
+        s = pygame.Surface((right - left + 1, bottom - top + 1), pygame.SRCALPHA)
+        pygame.draw.line(s, color, (start_pos[0] - left, start_pos[1] - top),
+                         (end_pos[0] - left, end_pos[1] - top), width)
+        return s, (left, top)
+
+    def shield_ring(self, radius, alpha):
+        """Returns the pre-rendered shield ring nearest to the given alpha."""
+        step = round(alpha * self.shield_alpha_steps / 255)
+        ring = self.shield_rings.get((radius, step))
+        if ring is None:
+            ring = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            shield_color = (BLUE[0], BLUE[1], BLUE[2], int(255 * step / self.shield_alpha_steps))
+            pygame.draw.circle(ring, shield_color, (radius, radius), radius, 4)
+            self.shield_rings[(radius, step)] = ring
+        return ring
+
+
+sprite_cache = SpriteCache()
+sprite_atlas = SpriteAtlas(settings.atlas_width)
+cannon_atlas = None
+explosion_frames = ExplosionFrames(settings.explosion_frames)
+overlay_renderer = OverlayRenderer(settings.shield_alpha_steps)
+
+
+def preload_sprites():
+    """Fills the sprite cache with every fixed size the draw methods use, once the sprites have loaded."""
+    global cannon_atlas
+    sprite_cache.preload(player_image, (60, 40))
+    sprite_cache.preload(player_cannon_image, (20, 80))
+    for enemy_type in ENEMY_TYPES.values():
+        sprite_cache.preload(globals()[enemy_type.image_name], enemy_type.draw_size)
+    # Bullet sizes are radius * 2: player bullets (3), player bombs (8), boss bombs (12)
+    sprite_cache.preload(player_bullet_image, (6, 6))
+    sprite_cache.preload(enemy_bullet_image, (6, 6))
+    sprite_cache.preload(bomb_bullet_image, (16, 16))
+    sprite_cache.preload(bomb_bullet_image, (24, 24))
+    # Drops have a radius of 13
+    sprite_cache.preload(coin_image, (26, 26))
+    sprite_cache.preload(shield_pickup_image, (26, 26))
+    # The cannon is rotated every frame, so bake its rotations once
+    if player_cannon_image:
+        cannon_atlas = RotationAtlas(sprite_cache.get(player_cannon_image, (20, 80)),
+                                     settings.cannon_rotation_steps)
+    # Explosions: enemy bullet hits (20), kills (50) and bomb blasts (BOMB_AOE)
+    explosion_frames.bake(20, RED)
+    explosion_frames.bake(50, RED)
+    explosion_frames.bake(settings.bomb_aoe, ORANGE)
+    # Shield rings around the 60px wide tank, one per alpha step
+    for step in range(1, settings.shield_alpha_steps + 1):
+        overlay_renderer.shield_ring(65, 255 * step // settings.shield_alpha_steps)
+    # Gather the scaled tank, enemy, bullet and pickup sprites into one atlas surface. Explosion
+    # frames stay separate: each has its own surface alpha, which subsurfaces of one atlas can't have.
+    sprite_cache.pack(sprite_atlas, settings.atlas_max_sprite)
+    # Enemies draw their type's sprite directly, without a cache lookup per draw
+    for enemy_type in ENEMY_TYPES.values():
+        image = globals()[enemy_type.image_name]
+        enemy_type.sprite = sprite_cache.get(image, enemy_type.draw_size) if image else None
+
+
+def preload_backgrounds():
+    """Scales the backgrounds loaded so far to full screen size."""
+    for group in assets.loaded:
+        for name in assets.groups[group]:
+            if name.endswith('_bg_image'):
+                sprite_cache.preload(globals()[name], (SCREEN_WIDTH, SCREEN_HEIGHT))
+
+
+assets.on_loaded('sprites', preload_sprites)
+assets.on_loaded('menu', preload_backgrounds)
+
+
+# --- Audio ---
+class VoiceManager:
+    """Plays sound effects on mixer channels reserved for each sound category.
+
+    A category can't play more voices at once than it has channels; when they are all busy, the
+    voice that started longest ago is cut off for the new one, so a burst of explosions can't
+    silence the cannon or pickups. The same sound requested again before end_frame() is only
+    played once.
+    """
+
+    def __init__(self, channel_counts):
+        total = sum(channel_counts.values())
+        pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)  # Keep Sound.play() from grabbing a category's channels
+        self.channels = {}
+        first = 0
+        for category, count in channel_counts.items():
+            self.channels[category] = [pygame.mixer.Channel(i) for i in range(first, first + count)]
+            first += count
+        self.started = {}  # Order in which each channel's current voice started
+        self.voice_count = 0
+        self.frame_sounds = set()
+        self.played = 0
+        self.deduplicated = 0
+        self.stolen = 0
+
+    def play(self, sound, category):
+        """Plays a sound on a free channel of its category, or on its category's oldest voice."""
+        if sound is None:
+            return
+        if sound in self.frame_sounds:
+            self.deduplicated += 1
+            return
+        self.frame_sounds.add(sound)
+
+        channels = self.channels[category]
+        for channel in channels:
+            if not channel.get_busy():
+                break
+        else:
+            channel = min(channels, key=self.started.get)
+            self.stolen += 1
+        channel.play(sound)
+        self.voice_count += 1
+        self.started[channel] = self.voice_count
+        self.played += 1
+
+    def end_frame(self):
+        """Lets sounds played this frame be played again."""
+        self.frame_sounds.clear()
+
+    def stats(self):
+        """Returns how many sounds were played, skipped as same-frame duplicates and played over older voices."""
+        return {'played': self.played, 'deduplicated': self.deduplicated, 'stolen': self.stolen}
+
+
+voices = VoiceManager(settings.sound_channels)
 
 
 # --- Classes ---
 
+# --- Input ---
+
+# Everything the simulation reads from the keyboard and mouse in one tick. `purchases` lists the
+# upgrades bought in the shop just before the tick: the live shop applies them itself, while
+# replays apply them with buy_upgrade() before stepping.
+TickInput = namedtuple('TickInput', ['left', 'right', 'shield', 'fire', 'mouse_x', 'mouse_y', 'purchases'],
+                       defaults=((),))
+
+
+def poll_input():
+    """Reads the current keyboard and mouse state into a TickInput."""
+    keys = pygame.key.get_pressed()
+    mouse_x, mouse_y = pygame.mouse.get_pos()
+    return TickInput(keys[pygame.K_LEFT] or keys[pygame.K_a], keys[pygame.K_RIGHT] or keys[pygame.K_d],
+                     keys[pygame.K_SPACE], pygame.mouse.get_pressed()[0], mouse_x, mouse_y)
+
+
+class NullInput:
+    """Input source for headless runs that never moves, shields or fires."""
+
+    IDLE = TickInput(False, False, False, False, SCREEN_WIDTH // 2, 0)
+
+    def poll(self, session):
+        return self.IDLE
+
+
+class ScriptedInput:
+    """Input source for headless runs that plays back a fixed sequence of TickInputs, then idles."""
+
+    def __init__(self, inputs):
+        self.inputs = list(inputs)
+        self.index = 0
+
+    def poll(self, session):
+        if self.index < len(self.inputs):
+            tick_input = self.inputs[self.index]
+            self.index += 1
+            return tick_input
+        return NullInput.IDLE
+
+
+class InputRecorder:
+    """Records a session's per-tick input and game time compactly so it can be replayed exactly.
+
+    Each tick is packed into 13 bytes (button flags, mouse position, game time) and the whole
+    log is zlib-compressed on save. Shop purchases are rare, so they are kept as
+    (tick, upgrade) pairs in the JSON header next to the level and RNG seed, and so are the
+    settings the level started with and any reloaded while it ran, as (tick, settings) pairs.
+    """
+
+    MAGIC = b"LOSER-REPLAY 4\n"  # Version 4: held-back wave spawns delay the rest of their wave
+    TICK_FORMAT = struct.Struct('<Bhhd')
+    LEFT, RIGHT, SHIELD, FIRE = 1, 2, 4, 8
+
+    def __init__(self, level, seed):
+        self.level = level
+        self.seed = seed
+        self.ticks = bytearray()
+        self.tick_count = 0
+        self.purchases = []
+        self.settings = [(0, settings.as_dict())]
+
+    def record_settings(self, new_settings):
+        """Notes settings that take effect from the next recorded tick on."""
+        self.settings.append((self.tick_count, new_settings.as_dict()))
+
+    def record(self, tick_input, now):
+        """Appends one tick's input along with the game time it was simulated at."""
+        flags = ((self.LEFT if tick_input.left else 0) | (self.RIGHT if tick_input.right else 0) |
+                 (self.SHIELD if tick_input.shield else 0) | (self.FIRE if tick_input.fire else 0))
+        self.ticks += self.TICK_FORMAT.pack(flags, int(tick_input.mouse_x), int(tick_input.mouse_y), now)
+        for upgrade_id in tick_input.purchases:
+            self.purchases.append((self.tick_count, upgrade_id))
+        self.tick_count += 1
+
+    def save(self, path):
+        header = {'level': self.level, 'seed': self.seed, 'ticks': self.tick_count, 'purchases': self.purchases,
+                  'settings': self.settings}
+        with open(path, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(zlib.compress(bytes(self.ticks)))
+
+
+class ReplayInput:
+    """Input source that plays back a file written by InputRecorder, tick by tick."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.readline() != InputRecorder.MAGIC:
+                raise ValueError(f"{path} is not a Loser replay file")
+            header = json.loads(f.readline())
+            data = zlib.decompress(f.read())
+        self.level = header['level']
+        self.seed = header['seed']
+        purchases = {}
+        for tick, upgrade_id in header['purchases']:
+            purchases.setdefault(tick, []).append(upgrade_id)
+        # Tick -> Settings in effect from that tick on
+        self.settings = {tick: Settings(values, path) for tick, values in header.get('settings', ())}
+
+        r = InputRecorder
+        self.inputs = []
+        self.times = []
+        for tick, (flags, mouse_x, mouse_y, now) in enumerate(r.TICK_FORMAT.iter_unpack(data)):
+            self.inputs.append(TickInput(bool(flags & r.LEFT), bool(flags & r.RIGHT), bool(flags & r.SHIELD),
+                                         bool(flags & r.FIRE), mouse_x, mouse_y, tuple(purchases.get(tick, ()))))
+            self.times.append(now)
+        self.index = 0
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def poll(self, session):
+        tick_input = self.inputs[self.index]
+        self.index += 1
+        return tick_input
+
+
 class Player:
     """Represents the player's tank and cannon."""
 
+    __slots__ = ('width', 'height', 'x', 'y', 'prev_x', 'health', 'cannon_angle', 'cannon_target_angle',
+                 'shield_active', 'shield_meter', 'coins', 'upgrades', 'is_hit_by_laser')
+
     def __init__(self):
         self.width = 60
         self.height = 40
         self.x = SCREEN_WIDTH // 2
         self.y = SCREEN_HEIGHT - 60
-        self.health = GAME_SETTINGS['PLAYER_HEALTH']
+        self.prev_x = self.x  # Position at the previous tick, for drawing between ticks
+        self.health = settings.player_health
         self.cannon_angle = -math.pi / 2
         self.cannon_target_angle = -math.pi / 2
         self.shield_active = False
-        self.shield_meter = GAME_SETTINGS['SHIELD_METER_MAX']
+        self.shield_meter = settings.shield_meter_max
         self.coins = 0
         self.upgrades = {'rapid_fire': False, 'bomb_gun': False, 'shield_upgrade': False}
         self.is_hit_by_laser = False  # Flag to indicate if player is currently in a laser beam
 
-    def draw(self, screen):
-        """Draws the tank and cannon on the screen."""
+    def draw(self, screen, alpha=1.0):
+        """Draws the tank and cannon on the screen and returns the area drawn over.
+
+        alpha (0 to 1) places the tank between its previous and current tick positions.
+        """
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.y
         if player_image:
             # Scale the image to fit the tank's dimensions and draw it
-            scaled_player_image = pygame.transform.scale(player_image, (self.width, self.height))
-            screen.blit(scaled_player_image, (self.x - self.width // 2, self.y - self.height // 2))
+            scaled_player_image = sprite_cache.get(player_image, (self.width, self.height))
+            rect = screen.blit(scaled_player_image, (x - self.width // 2, y - self.height // 2))
         else:
             # Fallback to drawing a shape if image failed to load
-            pygame.draw.rect(screen, GRAY_LIGHT,
-                             (self.x - self.width // 2, self.y - self.height // 2, self.width, self.height),
-                             border_radius=8)
-            pygame.draw.circle(screen, GRAY_DARK, (self.x, self.y), self.width // 3)
+            rect = pygame.draw.rect(screen, GRAY_LIGHT,
+                                    (x - self.width // 2, y - self.height // 2, self.width, self.height),
+                                    border_radius=8)
+            pygame.draw.circle(screen, GRAY_DARK, (x, y), self.width // 3)
 
         # Cannon
-        if player_cannon_image:
-            # Set cannon size (you can define these as class attributes or constants)
-            cannon_width = 20  # <--- Changeable width
-            cannon_height = 80  # <--- Changeable height
-
-            # Scale the cannon image before rotating
-            resized_cannon = pygame.transform.scale(player_cannon_image, (cannon_width, cannon_height))
-            rotated_cannon = pygame.transform.rotate(resized_cannon, -math.degrees(self.cannon_angle) - 90)
-            cannon_rect = rotated_cannon.get_rect(center=(self.x, self.y))
-            screen.blit(rotated_cannon, cannon_rect)
+        if cannon_atlas:
+            # Pick the nearest pre-rotated cannon (scaled to 20x80 in preload_sprites)
+            rotated_cannon = cannon_atlas.get(-math.degrees(self.cannon_angle) - 90)
+            cannon_rect = rotated_cannon.get_rect(center=(x, y))
+            rect.union_ip(screen.blit(rotated_cannon, cannon_rect))
 
         else:
             # Fallback to drawing a line
             cannon_length = 30
-            cannon_end_x = self.x + math.cos(self.cannon_angle) * cannon_length
-            cannon_end_y = self.y + math.sin(self.cannon_angle) * cannon_length
-            pygame.draw.line(screen, GRAY_DARK, (self.x, self.y), (cannon_end_x, cannon_end_y), 5)
+            cannon_end_x = x + math.cos(self.cannon_angle) * cannon_length
+            cannon_end_y = y + math.sin(self.cannon_angle) * cannon_length
+            rect.union_ip(pygame.draw.line(screen, GRAY_DARK, (x, y), (cannon_end_x, cannon_end_y), 5))
 
         # Shield
         if self.shield_active:
             shield_radius = self.width + 5
             # Shield color fades with meter level
-            alpha = int(255 * (self.shield_meter / GAME_SETTINGS['SHIELD_METER_MAX']))
-            if alpha > 0:
-                shield_color = (BLUE[0], BLUE[1], BLUE[2], alpha)
-                s = pygame.Surface((shield_radius * 2, shield_radius * 2), pygame.SRCALPHA)
-                pygame.draw.circle(s, shield_color, (shield_radius, shield_radius), shield_radius, 4)
-                screen.blit(s, (self.x - shield_radius, self.y - shield_radius))
-
-    def update(self, keys, mouse_pos):
+            shield_alpha = int(255 * (self.shield_meter / settings.shield_meter_max))
+            if shield_alpha > 0:
+                ring = overlay_renderer.shield_ring(shield_radius, shield_alpha)
+                rect.union_ip(screen.blit(ring, (x - shield_radius, y - shield_radius)))
+        return rect
+
+    def update(self, tick_input):
         """Updates player position and cannon angle based on input."""
-        speed = GAME_SETTINGS['PLAYER_SPEED']
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        self.prev_x = self.x
+        speed = settings.player_speed
+        if tick_input.left:
             self.x = max(self.width // 2, self.x - speed)
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+        if tick_input.right:
             self.x = min(SCREEN_WIDTH - self.width // 2, self.x + speed)
 
         # Spacebar to toggle shield
-        if keys[pygame.K_SPACE]:
+        if tick_input.shield:
             if not self.shield_active and self.shield_meter > 0:
                 self.shield_active = True
         else:
@@ -258,7 +1087,7 @@ class Player:
 
         if self.shield_active:
             # Drain shield meter
-            drain_rate = GAME_SETTINGS['SHIELD_DRAIN_RATE']
+            drain_rate = settings.shield_drain_rate
             if self.upgrades['shield_upgrade']:
                 drain_rate *= 0.5  # Shield upgrade makes it drain slower
             self.shield_meter -= drain_rate
@@ -269,8 +1098,8 @@ class Player:
         self.is_hit_by_laser = False  # Reset flag each frame
 
         # Cannon aiming logic
-        dx = mouse_pos[0] - self.x
-        dy = mouse_pos[1] - self.y
+        dx = tick_input.mouse_x - self.x
+        dy = tick_input.mouse_y - self.y
         self.cannon_target_angle = math.atan2(dy, dx)
         angle_diff = self.cannon_target_angle - self.cannon_angle
         while angle_diff > math.pi:
@@ -280,270 +1109,599 @@ class Player:
         self.cannon_angle += angle_diff * 0.1
 
 
-class Bullet:
-    """Represents a projectile fired by the player or enemy."""
-
-    def __init__(self, x, y, angle, speed, damage, is_bomb=False, from_player=True):
-        self.x = x
-        self.y = y
-        self.vx = math.cos(angle) * speed
-        self.vy = math.sin(angle) * speed
-        self.radius = 8 if is_bomb else 3
-        self.is_bomb = is_bomb
-        self.damage = damage
-        self.from_player = from_player
-
-    def draw(self, screen):
-        """Draws the bullet on the screen using an image."""
-        if self.from_player and not self.is_bomb and player_bullet_image:
-            img = pygame.transform.scale(player_bullet_image, (self.radius * 2, self.radius * 2))
-            rect = img.get_rect(center=(int(self.x), int(self.y)))
-            screen.blit(img, rect)
-        elif self.is_bomb and bomb_bullet_image:
-            img = pygame.transform.scale(bomb_bullet_image, (self.radius * 2, self.radius * 2))
-            rect = img.get_rect(center=(int(self.x), int(self.y)))
-            screen.blit(img, rect)
-        elif not self.from_player and enemy_bullet_image:
-            img = pygame.transform.scale(enemy_bullet_image, (self.radius * 2, self.radius * 2))
-            rect = img.get_rect(center=(int(self.x), int(self.y)))
-            screen.blit(img, rect)
-        else:
-            # Fallback to drawing a shape
-            color = RED if self.from_player and not self.is_bomb else ORANGE
-            if self.is_bomb:
-                color = (255, 100, 0)
-            pygame.draw.circle(screen, color, (int(self.x), int(self.y)), self.radius)
-
-    def update(self):
-        """Updates bullet position."""
-        self.x += self.vx
-        self.y += self.vy
+class ProjectileStore:
+    """Holds bullets and bombs as contiguous NumPy arrays instead of one object per projectile.
 
+    Live projectiles are packed into the first `count` slots of the x, y, vx, vy, damage,
+    radius and flags arrays, so movement, bomb gravity, off-screen culling and hit tests
+    each run as one vectorized operation per tick. prev_x and prev_y hold the positions at the
+    previous tick, for drawing between ticks.
+    """
 
-class BombBullet(Bullet):
-    """A special type of bullet for the boss that falls and explodes."""
+    ALIVE = 1  # Cleared when the projectile hits something
+    BOMB = 2  # Drawn as a bomb; player bombs explode with an AOE
+    GRAVITY = 4  # Boss bombs fall until they land and then sit on the ground
+    GROUNDED = 8
 
-    def __init__(self, x, y, damage):
-        super().__init__(x, y, 0, 0, damage, is_bomb=True, from_player=False)
-        self.radius = 12
-        self.vy = 2
-        self.grounded = False
+    def __init__(self, from_player, capacity=256):
+        self.from_player = from_player
+        self.count = 0
+        self.peak = 0
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.damage = np.zeros(capacity, dtype=np.int32)
+        self.radius = np.zeros(capacity, dtype=np.int32)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return self.count
+
+    def arrays(self):
+        """Returns every per-projectile array, in a fixed order."""
+        return self.x, self.y, self.prev_x, self.prev_y, self.vx, self.vy, self.damage, self.radius, self.flags
+
+    def grow(self):
+        """Doubles the capacity, keeping the live projectiles."""
+        self.capacity *= 2
+        self.x, self.y, self.prev_x, self.prev_y, self.vx, self.vy, self.damage, self.radius, self.flags = [
+            np.concatenate((arr, np.zeros_like(arr))) for arr in self.arrays()]
+
+    def snapshot(self):
+        """Returns a new store holding copies of the live projectiles, for drawing on another thread."""
+        n = self.count
+        store = ProjectileStore(self.from_player, capacity=max(n, 1))
+        for dst, src in zip(store.arrays(), self.arrays()):
+            dst[:n] = src[:n]
+        store.count = n
+        store.peak = self.peak
+        return store
+
+    def spawn(self, x, y, vx, vy, damage, radius, flags=0):
+        """Adds a projectile at the end of the packed range."""
+        if self.count == self.capacity:
+            self.grow()
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.damage[i] = damage
+        self.radius[i] = radius
+        self.flags[i] = flags | self.ALIVE
+        self.count += 1
+        if self.count > self.peak:
+            self.peak = self.count
+
+    def spawn_aimed(self, x, y, angle, speed, damage, is_bomb=False):
+        """Adds a bullet (or player bomb) flying at the given angle."""
+        self.spawn(x, y, math.cos(angle) * speed, math.sin(angle) * speed, damage, 8 if is_bomb else 3,
+                   self.BOMB if is_bomb else 0)
+
+    def spawn_bomb(self, x, y, damage):
+        """Adds a boss bomb that falls and stays where it lands."""
+        self.spawn(x, y, 0, 2, damage, 12, self.BOMB | self.GRAVITY)
 
     def update(self):
-        """Updates bomb position with gravity."""
-        if not self.grounded:
-            self.y += self.vy
-            if self.y >= SCREEN_HEIGHT - 60:
-                self.y = SCREEN_HEIGHT - 60
-                self.grounded = True
-                self.vx = 0
-                self.vy = 0
+        """Moves every projectile and lands falling bombs on the ground."""
+        n = self.count
+        x, y, vx, vy = self.x[:n], self.y[:n], self.vx[:n], self.vy[:n]
+        self.prev_x[:n] = x
+        self.prev_y[:n] = y
+        x += vx
+        y += vy
+        flags = self.flags[:n]
+        landed = ((flags & self.GRAVITY) != 0) & (y >= SCREEN_HEIGHT - 60)
+        if landed.any():
+            y[landed] = SCREEN_HEIGHT - 60
+            vx[landed] = 0
+            vy[landed] = 0
+            flags[landed] |= self.GROUNDED
+
+    def hits_in_rect(self, left, top, right, bottom):
+        """Returns the indices of live projectiles strictly inside the rectangle."""
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        inside = ((self.flags[:n] & self.ALIVE) != 0) & (x > left) & (x < right) & (y > top) & (y < bottom)
+        return np.flatnonzero(inside)
+
+    def is_alive(self, i):
+        return bool(self.flags[i] & self.ALIVE)
+
+    def kill(self, i):
+        """Marks a projectile as spent; it is removed on the next cull."""
+        self.flags[i] &= ~np.uint8(self.ALIVE)
+
+    def cull(self):
+        """Drops spent and off-screen projectiles, compacting the survivors to the front of the arrays."""
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        keep = ((self.flags[:n] & self.ALIVE) != 0) & (0 < x) & (x < SCREEN_WIDTH) & (0 < y) & (y < SCREEN_HEIGHT)
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for arr in self.arrays():
+            arr[:kept] = arr[:n][keep]
+        self.count = kept
+
+    def stats(self):
+        """Returns the live count, peak usage and allocated capacity."""
+        return {'in_use': self.count, 'peak': self.peak, 'capacity': self.capacity}
+
+    def draw(self, screen, alpha=1.0):
+        """Draws every projectile, batching the sprite blits into one call, and returns the areas drawn over.
+
+        alpha (0 to 1) places each projectile between its previous and current tick positions.
+        """
+        n = self.count
+        xs, ys = self.x[:n], self.y[:n]
+        if alpha != 1.0:
+            xs = self.prev_x[:n] + (xs - self.prev_x[:n]) * alpha
+            ys = self.prev_y[:n] + (ys - self.prev_y[:n]) * alpha
+        if self.from_player:
+            image = player_bullet_image
+            color = RED
+        else:
+            image = enemy_bullet_image
+            color = ORANGE
+        blits = []
+        rects = []
+        for x, y, radius, flags in zip(xs.astype(int).tolist(), ys.astype(int).tolist(),
+                                       self.radius[:n].tolist(), self.flags[:n].tolist()):
+            is_bomb = flags & self.BOMB
+            sprite_image = bomb_bullet_image if is_bomb else image
+            if sprite_image:
+                blits.append((sprite_cache.get(sprite_image, (radius * 2, radius * 2)), (x - radius, y - radius)))
+            else:
+                # Fallback to drawing a shape
+                rects.append(pygame.draw.circle(screen, (255, 100, 0) if is_bomb else color, (x, y), radius))
+        rects += screen.blits(blits)
+        return rects
 
 
 class LaserWarning:
     """Represents a visual warning for an upcoming laser attack."""
 
-    def __init__(self, start_pos, end_pos, duration=GAME_SETTINGS['LASER_WARNING_DURATION']):
+    __slots__ = ('start_pos', 'end_pos', 'width', 'start_time', 'duration', 'done', 'overlay', 'slot')
+
+    def __init__(self, now, start_pos, end_pos, duration=None):
+        self.reset(now, start_pos, end_pos, duration)
+
+    def reset(self, now, start_pos, end_pos, duration=None):
+        """Sets up the warning (lasting LASER_WARNING_DURATION unless given); also used to recycle pooled instances."""
         self.start_pos = start_pos
         self.end_pos = end_pos
         self.width = 10
-        self.start_time = pygame.time.get_ticks()
-        self.duration = duration
+        self.start_time = now
+        self.duration = settings.laser_warning_duration if duration is None else duration
         self.done = False
+        self.overlay = None  # Line surface, rendered on first draw and reused afterwards
 
-    def draw(self, screen):
-        """Draws the flashing warning line."""
-        elapsed_time = pygame.time.get_ticks() - self.start_time
-        if elapsed_time > self.duration:
+    def update(self, now):
+        """Marks the warning as done once its duration has passed."""
+        if now - self.start_time > self.duration:
             self.done = True
-            return
+
+    def draw(self, screen, now):
+        """Draws the flashing warning line and returns the area drawn over (None while flashed off)."""
+        elapsed_time = now - self.start_time
 
         # Flashing effect
         flash_interval = 200
         if (elapsed_time // flash_interval) % 2 == 0:
-            s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            color_with_alpha = WARNING_COLOR
-            pygame.draw.line(s, color_with_alpha, self.start_pos, self.end_pos, self.width)
-            screen.blit(s, (0, 0))
+            return screen.blit(*self.get_overlay())
+        return None
+
+    def get_overlay(self):
+        """Returns the line surface and its position, rendering them on first use."""
+        if self.overlay is None:
+            self.overlay = overlay_renderer.line_overlay(WARNING_COLOR, self.start_pos, self.end_pos, self.width)
+        return self.overlay
 
 
 class Laser:
     """Represents a laser beam fired by the boss."""
 
-    def __init__(self, start_pos, end_pos, duration=1000):
+    __slots__ = ('start_pos', 'end_pos', 'width', 'start_time', 'duration', 'done', 'hit_player', 'overlay', 'slot')
+
+    def __init__(self, now, start_pos, end_pos, duration=1000):
+        self.reset(now, start_pos, end_pos, duration)
+
+    def reset(self, now, start_pos, end_pos, duration=1000):
+        """Sets up the laser; also used to recycle pooled instances."""
         self.start_pos = start_pos
         self.end_pos = end_pos
         self.width = 10
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = now
         self.duration = duration
         self.done = False
         self.hit_player = False  # Flag to ensure damage is dealt only once
+        self.overlay = None  # Line surface, rendered on first draw and reused afterwards
 
-    def draw(self, screen):
-        """Draws the laser beam."""
-        elapsed_time = pygame.time.get_ticks() - self.start_time
-        if elapsed_time > self.duration:
+    def update(self, now):
+        """Marks the laser as done once its duration has passed."""
+        if now - self.start_time > self.duration:
             self.done = True
-            return
 
-        # Alpha transparency for a fading effect
-        alpha = 255 - int(255 * (elapsed_time / self.duration))
-        if alpha > 0:
-            s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            color_with_alpha = LASER_COLOR
-            pygame.draw.line(s, color_with_alpha, self.start_pos, self.end_pos, self.width)
-            screen.blit(s, (0, 0))
+    def draw(self, screen):
+        """Draws the laser beam and returns the area drawn over."""
+        return screen.blit(*self.get_overlay())
+
+    def get_overlay(self):
+        """Returns the line surface and its position, rendering them on first use."""
+        if self.overlay is None:
+            self.overlay = overlay_renderer.line_overlay(LASER_COLOR, self.start_pos, self.end_pos, self.width)
+        return self.overlay
 
 
 class Enemy:
-    """Base class for all enemies with random movement."""
+    """Base class for all enemies with random movement.
 
-    def __init__(self, type, x, y, speed, health, width, height, can_fire, fire_rate_mod=1):
-        self.type = type
-        self.x = x
-        self.y = y
+    Everything that differs between kinds of enemy lives in its EnemyType record (`kind`),
+    which is looked up once at spawn, so the per-tick methods never compare type names.
+    """
+
+    __slots__ = ('kind', 'x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'health', 'can_fire', 'fire_interval',
+                 'last_fire_time', 'destroyed', 'vx', 'vy', 'slot')
+
+    def __init__(self, now, kind, x, y, speed, health, width, height, can_fire, fire_rate_mod=1, rng=random):
+        self.kind = kind
+        self.x = self.prev_x = x  # prev_x/prev_y: position at the previous tick, for drawing between ticks
+        self.y = self.prev_y = y
         self.width = width
         self.height = height
         self.health = health
-        self.can_fire = can_fire
-        self.fire_rate_mod = fire_rate_mod
-        self.last_fire_time = pygame.time.get_ticks()
+        # Types without a fire interval (the boss) attack through GameSession.boss_logic instead
+        self.can_fire = can_fire and kind.fire_interval is not None
+        # The level scales the fire rate
+        self.fire_interval = kind.fire_interval / fire_rate_mod if self.can_fire else None
+        self.last_fire_time = now
+        self.destroyed = False  # Set when killed so the collision pass can skip it until it is removed
 
         self.vx = speed if x == 0 else -speed
-        self.vy = 0
-        if self.type == 'boss':
-            self.vy = speed
-        elif self.type != 'tank':
-            self.vy = random.uniform(-1, 1)
+        self.vy = kind.start_vy(speed, rng)
 
-    def draw(self, screen):
-        """Draws the enemy on the screen using an image."""
-        image = None
-        if self.type == 'helicopter' and enemy_helicopter_image:
-            image = enemy_helicopter_image
-        elif self.type == 'jet' and enemy_jet_image:
-            image = enemy_jet_image
-        elif self.type == 'tank' and enemy_tank_image:
-            image = enemy_tank_image
-        elif self.type == 'boss' and boss_image:
-            image = boss_image
-        elif self.type == 'medic_helicopter' and medic_helicopter_image:
-            image = medic_helicopter_image
+    def draw(self, screen, alpha=1.0):
+        """Draws the enemy on the screen using an image and returns the area drawn over.
 
-        if image:
-            # Optional: override default size per enemy type
-            if self.type == 'helicopter':
-                image_width, image_height = 100, 60
-            elif self.type == 'jet':
-                image_width, image_height = 120, 55
-            elif self.type == 'tank':
-                image_width, image_height = 90, 70
-            elif self.type == 'boss':
-                image_width, image_height = 150, 100
-            elif self.type == 'medic_helicopter':
-                image_width, image_height = 100, 55
-            else:
-                image_width, image_height = self.width, self.height  # fallback
-
-            scaled_image = pygame.transform.scale(image, (image_width, image_height))
-            rect = scaled_image.get_rect(center=(self.x, self.y))
-            screen.blit(scaled_image, rect)
-        else:
-            # Fallback to drawing a shape if image failed to load
-            color_map = {
-                'helicopter': GREEN,
-                'jet': ORANGE,
-                'tank': (148, 163, 184),
-                'boss': PURPLE,
-                'medic_helicopter': MEDIC_COLOR
-            }
-            color = color_map.get(self.type, WHITE)
-            if self.type == 'tank':
-                # Tank body
-                pygame.draw.rect(screen, color,
-                                 (self.x - self.width // 2, self.y - self.height // 2, self.width, self.height),
-                                 border_radius=5)
-                pygame.draw.rect(screen, GRAY_DARK,
-                                 (self.x - self.width // 2, self.y - self.height // 2 - 10, self.width, 10))
-            elif self.type == 'boss':
-                pygame.draw.rect(screen, color,
-                                 (self.x - self.width // 2, self.y - self.height // 2, self.width, self.height),
-                                 border_radius=15)
-            else:
-                # Air enemies
-                pygame.draw.rect(screen, color,
-                                 (self.x - self.width // 2, self.y - self.height // 2, self.width, self.height))
-                if self.type == 'medic_helicopter':
-                    draw_text(screen, "+", font, RED, self.x, self.y, centered=True)
+        alpha (0 to 1) places the enemy between its previous and current tick positions.
+        """
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        sprite = self.kind.sprite
+        if sprite:
+            return screen.blit(sprite, sprite.get_rect(center=(x, y)))
+        # Fallback to drawing a shape if the image failed to load (or hasn't loaded yet)
+        return self.kind.draw_shape(screen, self, x, y)
 
     def update(self):
-        """Updates enemy position with random movement, restricted to the top of the screen."""
-        if self.type == 'tank':
-            # Tanks move horizontally on the ground, bouncing off walls
-            self.x += self.vx
-            if self.x <= self.width // 2 or self.x >= SCREEN_WIDTH - self.width // 2:
-                self.vx *= -1
-        elif self.type == 'boss':
-            # Boss bounces off screen edges
-            self.x += self.vx
-            self.y += self.vy
-            if self.x <= self.width // 2 or self.x >= SCREEN_WIDTH - self.width // 2:
-                self.vx *= -1
-            if self.y <= self.height // 2 or self.y >= SCREEN_HEIGHT * 0.5 - self.height // 2:
-                self.vy *= -1
-        else:
-            # Air enemies fly across the screen with a slight vertical movement
-            self.x += self.vx
-            self.y += self.vy
-
-            # Keep air enemies within the upper part of the screen
-            min_y = SCREEN_HEIGHT * 0.1
-            max_y = SCREEN_HEIGHT * 0.5
-            if self.y <= min_y or self.y >= max_y:
-                self.vy *= -1
-
-    def fire(self, player_x, player_y):
-        """Enemy firing logic, returns a bullet if it fires."""
-        now = pygame.time.get_ticks()
-        fire_rate = 2000
-        damage = GAME_SETTINGS['ENEMY_BULLET_DAMAGE']
-        new_bullets = []
-
-        if self.type == 'jet':
-            fire_rate = 1500
-        elif self.type == 'tank':
-            fire_rate = 3000
-            damage = GAME_SETTINGS['TANK_BULLET_DAMAGE']
-        elif self.type == 'boss':
-            fire_rate = 1000
-            # Boss attacks are handled separately in the main loop based on a timer
-            return new_bullets
-
-        # Apply a modification to the fire rate based on level
-        fire_rate /= self.fire_rate_mod
-
-        if self.can_fire and now - self.last_fire_time > fire_rate:
+        """Moves the enemy the way its type moves."""
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.kind.move(self)
+
+    def fire(self, player_x, player_y, enemy_bullets, now):
+        """Enemy firing logic, adds a bullet to enemy_bullets if it fires."""
+        if self.can_fire and now - self.last_fire_time > self.fire_interval:
             angle = math.atan2(player_y - self.y, player_x - self.x)
             self.last_fire_time = now
-            new_bullets.append \
-                (Bullet(self.x, self.y, angle, GAME_SETTINGS['ENEMY_BULLET_SPEED'], damage, from_player=False))
-        return new_bullets
+            enemy_bullets.spawn_aimed(self.x, self.y, angle, settings.enemy_bullet_speed, self.kind.damage)
+
+
+# --- Enemy Types ---
+def move_ground(enemy):
+    """Tanks move horizontally on the ground, bouncing off walls."""
+    enemy.x += enemy.vx
+    if enemy.x <= enemy.width // 2 or enemy.x >= SCREEN_WIDTH - enemy.width // 2:
+        enemy.vx *= -1
+
+
+def move_bouncing(enemy):
+    """The boss bounces off the screen edges and the middle of the screen."""
+    enemy.x += enemy.vx
+    enemy.y += enemy.vy
+    if enemy.x <= enemy.width // 2 or enemy.x >= SCREEN_WIDTH - enemy.width // 2:
+        enemy.vx *= -1
+    if enemy.y <= enemy.height // 2 or enemy.y >= SCREEN_HEIGHT * 0.5 - enemy.height // 2:
+        enemy.vy *= -1
+
+
+def move_air(enemy):
+    """Air enemies fly across the screen with a slight vertical movement, kept within the upper part of the screen."""
+    enemy.x += enemy.vx
+    enemy.y += enemy.vy
+    if enemy.y <= SCREEN_HEIGHT * 0.1 or enemy.y >= SCREEN_HEIGHT * 0.5:
+        enemy.vy *= -1
+
+
+def drift_vy(speed, rng):
+    """Air enemies start drifting slowly up or down."""
+    return rng.uniform(-1, 1)
+
+
+def level_vy(speed, rng):
+    return 0
+
+
+def diagonal_vy(speed, rng):
+    return speed
+
+
+def sky_spawn_y(rng):
+    """Air enemies enter at a random height in the upper part of the screen."""
+    return rng.uniform(SCREEN_HEIGHT * 0.1, SCREEN_HEIGHT * 0.5)
+
+
+def ground_spawn_y(rng):
+    return SCREEN_HEIGHT - 40
+
+
+def draw_tank_shape(screen, enemy, x, y):
+    """Draws a tank body with a turret on top."""
+    rect = pygame.draw.rect(screen, enemy.kind.color,
+                            (x - enemy.width // 2, y - enemy.height // 2, enemy.width, enemy.height), border_radius=5)
+    return rect.union(pygame.draw.rect(screen, GRAY_DARK,
+                                       (x - enemy.width // 2, y - enemy.height // 2 - 10, enemy.width, 10)))
+
+
+def draw_boss_shape(screen, enemy, x, y):
+    """Draws a big rounded block."""
+    return pygame.draw.rect(screen, enemy.kind.color,
+                            (x - enemy.width // 2, y - enemy.height // 2, enemy.width, enemy.height), border_radius=15)
+
+
+def draw_air_shape(screen, enemy, x, y):
+    """Draws a plain block."""
+    return pygame.draw.rect(screen, enemy.kind.color,
+                            (x - enemy.width // 2, y - enemy.height // 2, enemy.width, enemy.height))
+
+
+def draw_medic_shape(screen, enemy, x, y):
+    """Draws an air enemy with a red cross."""
+    rect = draw_air_shape(screen, enemy, x, y)
+    draw_text(screen, "+", font, RED, x, y, centered=True)
+    return rect
+
+
+class EnemyType:
+    """The fixed properties of one kind of enemy, shared by every enemy of that kind.
+
+    Values that come from the settings (damage, score, coins and the drop table) are filled in by
+    configure(), and the scaled sprite by preload_sprites() once the sprites have loaded.
+    """
+
+    __slots__ = ('name', 'image_name', 'draw_size', 'color', 'draw_shape', 'move', 'start_vy', 'spawn_y', 'health',
+                 'size', 'fire_interval', 'damage_setting', 'regular', 'is_boss', 'is_medic', 'sprite', 'damage',
+                 'score', 'coins', 'drops')
+
+    def __init__(self, name, image_name, draw_size, color, draw_shape, move, start_vy, spawn_y=None, health=1,
+                 size=(50, 30), fire_interval=None, damage_setting='enemy_bullet_damage', regular=True,
+                 is_boss=False, is_medic=False):
+        self.name = name
+        self.image_name = image_name  # Module global the asset manager loads the image into
+        self.draw_size = draw_size
+        self.color = color  # Shape colour while there's no image
+        self.draw_shape = draw_shape
+        self.move = move
+        self.start_vy = start_vy  # (speed, rng) -> initial vertical speed
+        self.spawn_y = spawn_y  # rng -> height it enters the screen at in waves; None if it can't be in a wave
+        self.health = health
+        self.size = size  # Hitbox (width, height)
+        self.fire_interval = fire_interval  # ms between shots at level 1; None if it doesn't fire bullets itself
+        self.damage_setting = damage_setting  # Settings attribute holding its bullets' damage
+        self.regular = regular  # Counts towards the on-screen cap and level progress, wraps around the screen
+        self.is_boss = is_boss
+        self.is_medic = is_medic  # Any hit downs it and is penalized; it never drops anything
+        self.sprite = None
+        self.configure(settings)
+
+    def configure(self, settings):
+        """Reads the type's damage, score, coin value and drop table from the settings."""
+        self.damage = getattr(settings, self.damage_setting)
+        self.score = settings.scores.get(self.name, 10)
+        self.coins = settings.coin_values.get(self.name, 5)
+        drop_chances = settings.enemy_drop_chances
+        # (drop type, chance) pairs, rolled in order on each kill
+        self.drops = () if self.is_medic else (('coin', drop_chances['coin']), ('shield', drop_chances['shield']))
+
+
+ENEMY_TYPES = {enemy_type.name: enemy_type for enemy_type in (
+    EnemyType('helicopter', 'enemy_helicopter_image', (100, 60), GREEN, draw_air_shape, move_air, drift_vy,
+              sky_spawn_y, health=10, fire_interval=2000),
+    EnemyType('jet', 'enemy_jet_image', (120, 55), ORANGE, draw_air_shape, move_air, drift_vy, sky_spawn_y,
+              health=20, fire_interval=1500),
+    EnemyType('tank', 'enemy_tank_image', (90, 70), (148, 163, 184), draw_tank_shape, move_ground, level_vy,
+              ground_spawn_y, health=50, size=(80, 40), fire_interval=3000, damage_setting='tank_bullet_damage'),
+    EnemyType('boss', 'boss_image', (150, 100), PURPLE, draw_boss_shape, move_bouncing, diagonal_vy,
+              size=(150, 150), regular=False, is_boss=True),
+    EnemyType('medic_helicopter', 'medic_helicopter_image', (100, 55), MEDIC_COLOR, draw_medic_shape, move_air,
+              drift_vy, sky_spawn_y, regular=False, is_medic=True),
+)}
+
+
+def configure_enemy_types():
+    """Re-reads the settings-driven values of every enemy type, after use_settings() swapped the settings."""
+    for enemy_type in ENEMY_TYPES.values():
+        enemy_type.configure(settings)
+
+
+# --- Levels ---
+LEVEL_FILE = os.path.join("levels", "level{}.json")  # Level n is described by this file
+LEVELS_PER_PAGE = 6  # Level buttons shown at once in the main menu
+
+# A wave of a level file, with its enemy type names resolved to EnemyTypes: `count` spawns (or
+# with a count of None, one spawn every `interval` ms until the boss appears) starting `start` ms
+# into the level, each of a type picked at random from `kinds`. regular is whether the kinds are
+# regular enemies, which count towards the on-screen cap and the level's progress.
+Wave = namedtuple('Wave', ['kinds', 'start', 'interval', 'count', 'speed', 'regular'])
+
+
+class LevelFileError(ValueError):
+    """A level file that can't be read or fails Level's checks; the message names the file."""
+
+
+class Level:
+    """A level file, checked once when it is loaded.
+
+    Level files are JSON objects with these keys (levels/level1.json is an example):
+      background, music           the level's .png background and .mp3 or .ogg music file, loaded in
+                                  an asset group of the level's own ('level3' for level 3)
+      enemy_fire_rate             multiplier above 0 for how often enemies fire
+      max_on_screen               regular enemies on screen at once (default MAX_ENEMIES_ON_SCREEN)
+      waves                       list of {types, start, interval, count, speed}; count may be left
+                                  out for enemies that aren't regular (medics), to repeat until the boss;
+                                  waves of more than one enemy need an interval (ms) above 0
+      boss                        {health, speed}; health must be above 0
+    Every count, interval, start, speed, rate and health must be a number. The boss appears once
+    every regular enemy from the waves has been destroyed.
+    """
+
+    def __init__(self, number, data):
+        self.number = number
+        try:
+            background_file, music_file = data['background'], data['music']
+            if not (isinstance(background_file, str) and background_file.endswith('.png')):
+                raise ValueError(f"background must be a .png file, not {background_file!r}")
+            if not (isinstance(music_file, str) and music_file.endswith(('.mp3', '.ogg'))):
+                raise ValueError(f"music must be an .mp3 or .ogg file, not {music_file!r}")
+            self.enemy_fire_rate = self.check_number(data.get('enemy_fire_rate', 1), 'enemy_fire_rate', positive=True)
+            self.max_on_screen = data.get('max_on_screen')  # None: MAX_ENEMIES_ON_SCREEN, read at each spawn
+            if self.max_on_screen is not None and self.max_on_screen < 1:
+                raise ValueError(f"max_on_screen must be at least 1, not {self.max_on_screen}")
+            self.waves = [self.parse_wave(wave) for wave in data['waves']]
+            self.boss_health = self.check_number(data['boss']['health'], 'boss health', positive=True)
+            self.boss_speed = self.check_number(data['boss'].get('speed', 1), 'boss speed')
+        except (KeyError, TypeError, ValueError) as e:
+            raise LevelFileError(f"Invalid level file {LEVEL_FILE.format(number)}: {e!r}") from None
+        self.total_enemies = sum(wave.count for wave in self.waves if wave.regular)
+        # The asset group to wait for, and the globals the background and music are stored in
+        self.assets = f"level{number}"
+        self.background = f"level{number}_bg_image"
+        self.music = f"level{number}_music"
+        if assets.add_group(self.assets, {self.background: background_file, self.music: music_file}):
+            assets.on_loaded(self.assets, preload_backgrounds)
+
+    @staticmethod
+    def check_number(value, name, positive=False):
+        """Returns value if it is a number (above 0 if positive), otherwise raises ValueError."""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{name} must be a number, not {value!r}")
+        if positive and value <= 0:
+            raise ValueError(f"{name} must be above 0, not {value}")
+        return value
+
+    @classmethod
+    def parse_wave(cls, data):
+        kinds = tuple(ENEMY_TYPES[name] for name in data['types'])
+        if not kinds or any(kind.spawn_y is None for kind in kinds):
+            raise ValueError(f"a wave needs one or more enemy types that can spawn in waves: {data['types']}")
+        regular = kinds[0].regular
+        if any(kind.regular != regular for kind in kinds):
+            raise ValueError(f"a wave can't mix regular enemies with others: {data['types']}")
+        count = data.get('count')
+        if count is None and regular:
+            raise ValueError(f"waves of regular enemies need a count: {data['types']}")
+        if count is not None and (not isinstance(count, int) or count < 1):
+            raise ValueError(f"a wave's count must be a whole number of at least 1, not {count!r}")
+        interval = cls.check_number(data.get('interval', 0), "a wave's interval")
+        if interval < 0:
+            raise ValueError(f"a wave's interval can't be negative: {interval}")
+        if (count is None or count > 1) and interval == 0:
+            raise ValueError(f"waves of more than one enemy need an interval: {data['types']}")
+        start = cls.check_number(data.get('start', 0), "a wave's start")
+        return Wave(kinds, start, interval, count, cls.check_number(data['speed'], "a wave's speed"), regular)
+
+
+levels = {}  # Level number -> Level, filled as levels are loaded
+
+
+def load_level(number):
+    """Returns level `number`, reading its file the first time it is needed."""
+    level = levels.get(number)
+    if level is None:
+        path = LEVEL_FILE.format(number)
+        with open(path) as f:
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise LevelFileError(f"Invalid level file {path}: {e}") from None
+        level = levels[number] = Level(number, data)
+    return level
+
+
+def level_count():
+    """Returns the number of levels, i.e. how many level files there are in sequence from level 1."""
+    count = 0
+    while os.path.exists(LEVEL_FILE.format(count + 1)):
+        count += 1
+    return count
+
+
+class SpawnSchedule:
+    """Waves compiled into a time-ordered heap holding the next spawn of each wave.
+
+    Each tick only the earliest spawn is looked at, so checking for spawns costs the same however
+    many waves there are. Taking a spawn queues the wave's next one `interval` ms after the tick it
+    actually spawned on, so a spawn held back (by the on-screen cap) delays the rest of its wave
+    instead of piling up behind it. Waves with a count of None repeat until the boss appears.
+    """
+
+    def __init__(self, waves, start_time):
+        self.waves = waves
+        self.remaining = [wave.count for wave in waves]  # Spawns left per wave; None for repeating waves
+        self.queue = [(start_time + wave.start, index, index) for index, wave in enumerate(waves)]
+        self.order = len(waves)  # Keeps spawns at the same time in file order
+        heapq.heapify(self.queue)
+
+    def due(self, now):
+        """Returns the wave of the earliest spawn if it is due by now, else None."""
+        queue = self.queue
+        if queue and queue[0][0] <= now:
+            return self.waves[queue[0][2]]
+        return None
+
+    def take(self, now):
+        """Removes the earliest spawn, made at `now`, and queues the next one of its wave if there is one."""
+        _, _, index = heapq.heappop(self.queue)
+        remaining = self.remaining[index]
+        if remaining is not None:
+            remaining -= 1
+            self.remaining[index] = remaining
+            if remaining == 0:
+                return
+        heapq.heappush(self.queue, (now + self.waves[index].interval, self.order, index))
+        self.order += 1
 
 
 class Drop:
     """Represents a dropped item (coin or shield pickup)."""
 
-    def __init__(self, type, x, y):
+    __slots__ = ('type', 'x', 'y', 'prev_y', 'vy', 'radius', 'spawn_time', 'grounded', 'done', 'slot')
+
+    def __init__(self, now, type, x, y):
+        self.reset(now, type, x, y)
+
+    def reset(self, now, type, x, y):
+        """Sets up the drop; also used to recycle pooled instances."""
         self.type = type
         self.x = x
-        self.y = y
+        self.y = self.prev_y = y  # prev_y: height at the previous tick, for drawing between ticks
         self.vy = 2  # Downward velocity
         self.radius = 13
-        self.spawn_time = pygame.time.get_ticks()
+        self.spawn_time = now
         self.grounded = False
+        self.done = False  # Set once collected or despawned
 
-    def draw(self, screen):
-        """Draws the drop on the screen using an image."""
+    def draw(self, screen, alpha=1.0):
+        """Draws the drop on the screen using an image and returns the area drawn over.
+
+        alpha (0 to 1) places the drop between its previous and current tick heights.
+        """
+        y = self.prev_y + (self.y - self.prev_y) * alpha
         image = None
         if self.type == 'coin' and coin_image:
             image = coin_image
@@ -551,18 +1709,21 @@ class Drop:
             image = shield_pickup_image
 
         if image:
-            scaled_image = pygame.transform.scale(image, (self.radius * 2, self.radius * 2))
-            rect = scaled_image.get_rect(center=(int(self.x), int(self.y)))
-            screen.blit(scaled_image, rect)
+            scaled_image = sprite_cache.get(image, (self.radius * 2, self.radius * 2))
+            rect = scaled_image.get_rect(center=(int(self.x), int(y)))
+            return screen.blit(scaled_image, rect)
         else:
             # Fallback to drawing a shape
             color = YELLOW if self.type == 'coin' else BLUE
-            pygame.draw.circle(screen, color, (int(self.x), int(self.y)), self.radius)
+            rect = pygame.draw.circle(screen, color, (int(self.x), int(y)), self.radius)
             icon_text = "$" if self.type == 'coin' else "S"
-            draw_text(screen, icon_text, font, BLACK, self.x, self.y, centered=True)
+            return rect.union(draw_text(screen, icon_text, font, BLACK, self.x, y, centered=True))
 
-    def update(self):
-        """Drops fall until they hit the bottom of the screen."""
+    def update(self, now):
+        """Drops fall until they hit the bottom of the screen, and despawn after a while."""
+        if now - self.spawn_time >= settings.drop_despawn_time:
+            self.done = True
+        self.prev_y = self.y
         if not self.grounded:
             self.y += self.vy
             if self.y >= SCREEN_HEIGHT - 60:  # Stop falling at player's y-level
@@ -573,52 +1734,255 @@ class Drop:
 class Explosion:
     """A simple class to handle visual explosions using a sprite."""
 
-    def __init__(self, x, y, size, bomb=False):
+    __slots__ = ('x', 'y', 'size', 'color', 'start_time', 'duration', 'done', 'slot')
+
+    def __init__(self, now, x, y, size, bomb=False):
+        self.reset(now, x, y, size, bomb)
+
+    def reset(self, now, x, y, size, bomb=False):
+        """Sets up the explosion; also used to recycle pooled instances."""
         self.x = x
         self.y = y
         self.size = size
         self.color = ORANGE if bomb else RED
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = now
         self.duration = 500  # milliseconds
         self.done = False
 
-    def draw(self, screen):
-        """Draws the explosion effect."""
-        elapsed_time = pygame.time.get_ticks() - self.start_time
-        if elapsed_time > self.duration:
+    def update(self, now):
+        """Marks the explosion as done once its animation has finished."""
+        if now - self.start_time > self.duration:
             self.done = True
-            return
 
-        progress = elapsed_time / self.duration
-        current_radius = int(self.size * (progress + 0.1))  # Start from a small size
+    def draw(self, screen, now):
+        """Draws the explosion effect and returns the area drawn over."""
+        elapsed_time = now - self.start_time
 
-        # Use image if available
-        if explosion_image:
-            alpha = 255 - int(255 * progress)
-            if alpha > 0:
-                scaled_image = pygame.transform.scale(explosion_image, (current_radius * 2, current_radius * 2))
-                scaled_image.set_alpha(alpha)
-                rect = scaled_image.get_rect(center=(self.x, self.y))
-                screen.blit(scaled_image, rect)
+        # Frames are pre-rendered in explosion_frames, so just pick the one for this point in time
+        frame = explosion_frames.get(self.size, self.color, elapsed_time / self.duration)
+        rect = frame.get_rect(center=(self.x, self.y))
+        return screen.blit(frame, rect)
+
+
+class ObjectPool:
+    """Recycles instances of a short-lived class instead of allocating new ones.
+
+    Released objects are kept on a free list of up to `capacity` entries and re-initialized
+    with their class's reset() when acquired again.
+    """
+
+    def __init__(self, cls, capacity):
+        self.cls = cls
+        self.capacity = capacity
+        self.free = []
+        self.in_use = 0
+        self.peak = 0
+        self.created = 0
+
+    def acquire(self, *args):
+        """Returns a recycled (or, if none are free, new) object set up with the given arguments."""
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
         else:
-            # Fallback to drawing a shape
-            s = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
-            alpha = 255 - int(255 * progress)
-            if alpha > 0:
-                color_with_alpha = self.color + (alpha,)
-                pygame.draw.circle(s, color_with_alpha, (self.size, self.size), current_radius)
-                screen.blit(s, (self.x - self.size, self.y - self.size))
+            obj = self.cls(*args)
+            self.created += 1
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return obj
+
+    def release(self, obj):
+        """Hands an object back to the pool once the game no longer uses it."""
+        self.in_use -= 1
+        if len(self.free) < self.capacity:
+            self.free.append(obj)
+
+    def stats(self):
+        """Returns the pool's usage counters."""
+        return {'in_use': self.in_use, 'free': len(self.free), 'peak': self.peak, 'created': self.created}
+
+
+explosion_pool = ObjectPool(Explosion, settings.pool_capacity)
+drop_pool = ObjectPool(Drop, settings.pool_capacity)
+laser_pool = ObjectPool(Laser, settings.pool_capacity)
+laser_warning_pool = ObjectPool(LaserWarning, settings.pool_capacity)
+
+
+def pool_stats():
+    """Returns the usage counters of every object pool, keyed by class name."""
+    return {pool.cls.__name__: pool.stats() for pool in (explosion_pool, drop_pool, laser_pool, laser_warning_pool)}
+
+
+# --- Entity World ---
+class EntityList(list):
+    """The live entities of one kind, in no particular order, with constant-time removal.
+
+    Each entity keeps its index in its `slot` attribute, so discard() moves the last entity into
+    the gap instead of shifting everything after it down. Entities that finish while the list is
+    being looped over are queued with retire() and removed by compact(), which also hands them
+    back to the list's pool.
+    """
+
+    def __init__(self, pool=None):
+        super().__init__()
+        self.pool = pool
+        self.retired = []
+
+    def add(self, obj):
+        obj.slot = len(self)
+        self.append(obj)
+
+    def discard(self, obj):
+        """Removes an entity now; the entity that was last takes its place."""
+        last = self.pop()
+        if last is not obj:
+            self[obj.slot] = last
+            last.slot = obj.slot
+
+    def retire(self, obj):
+        """Queues a finished entity for removal at the next compact()."""
+        self.retired.append(obj)
+
+    def compact(self):
+        """Removes the retired entities, returning them to the pool."""
+        for obj in self.retired:
+            self.discard(obj)
+            if self.pool is not None:
+                self.pool.release(obj)
+        self.retired.clear()
+
+    def release_all(self):
+        """Empties the list, returning everything in it to the pool."""
+        if self.pool is not None:
+            for obj in self:
+                self.pool.release(obj)
+        self.clear()
+        self.retired.clear()
+
+
+class EntityWorld:
+    """Every enemy, drop, explosion, laser and laser warning in a session.
+
+    Enemies are added and removed through add_enemy() and remove_enemy(), which keep the count of
+    each enemy type on screen and the boss handle up to date, so the spawn cap and the boss
+    attacks never have to scan the enemy list. The other kinds are retired when they finish and
+    compacted once per tick, so the bookkeeping costs as much as what changed, not what exists.
+    """
+
+    def __init__(self):
+        self.enemies = EntityList()
+        self.drops = EntityList(drop_pool)
+        self.explosions = EntityList(explosion_pool)
+        self.lasers = EntityList(laser_pool)
+        self.laser_warnings = EntityList(laser_warning_pool)
+        self.kind_counts = {}  # EnemyType: number on screen
+        self.regular_count = 0  # Enemies on screen that count towards level progress
+        self.boss = None  # The boss Enemy while it is alive
+        self.boss_fight = False  # Set once the boss has appeared; waves stop spawning
+        self.destroyed = 0  # Regular enemies killed, the level's progress
+
+    def add_enemy(self, enemy):
+        kind = enemy.kind
+        self.enemies.add(enemy)
+        self.kind_counts[kind] = self.kind_counts.get(kind, 0) + 1
+        if kind.regular:
+            self.regular_count += 1
+        if kind.is_boss:
+            self.boss = enemy
+            self.boss_fight = True
+
+    def remove_enemy(self, enemy):
+        kind = enemy.kind
+        self.enemies.discard(enemy)
+        self.kind_counts[kind] -= 1
+        if kind.regular:
+            self.regular_count -= 1
+        if enemy is self.boss:
+            self.boss = None
+
+    def count(self, kind):
+        """Returns how many enemies of a type are on screen."""
+        return self.kind_counts.get(kind, 0)
+
+    def compact(self):
+        """Removes the finished drops, explosions, lasers and warnings."""
+        for items in (self.drops, self.explosions, self.lasers, self.laser_warnings):
+            if items.retired:
+                items.compact()
+
+    def release_all(self):
+        """Hands everything still on screen back to the pools."""
+        for items in (self.drops, self.explosions, self.lasers, self.laser_warnings):
+            items.release_all()
+
+
+class SpatialHash:
+    """Uniform grid over the playfield for finding entities near a point or area.
+
+    Entities are re-inserted every tick, and queries only look at the grid cells the
+    query area touches instead of scanning every entity.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        """Removes every entity from the grid."""
+        self.cells.clear()
+
+    def insert_point(self, obj, x, y):
+        """Adds an entity that occupies a single point, such as a bullet."""
+        key = (int(x // self.cell_size), int(y // self.cell_size))
+        if key in self.cells:
+            self.cells[key].append(obj)
+        else:
+            self.cells[key] = [obj]
+
+    def insert_rect(self, obj, left, top, right, bottom):
+        """Adds an entity to every cell its bounding box overlaps."""
+        size = self.cell_size
+        for cx in range(int(left // size), int(right // size) + 1):
+            for cy in range(int(top // size), int(bottom // size) + 1):
+                key = (cx, cy)
+                if key in self.cells:
+                    self.cells[key].append(obj)
+                else:
+                    self.cells[key] = [obj]
+
+    def query_point(self, x, y):
+        """Returns the entities in the cell containing the point."""
+        return self.cells.get((int(x // self.cell_size), int(y // self.cell_size)), ())
+
+    def query_rect(self, left, top, right, bottom):
+        """Returns each entity in the cells overlapping the area once, in insertion order per cell."""
+        size = self.cell_size
+        found = {}
+        for cx in range(int(left // size), int(right // size) + 1):
+            for cy in range(int(top // size), int(bottom // size) + 1):
+                for obj in self.cells.get((cx, cy), ()):
+                    found[obj] = True
+        return list(found)
+
+    def query_radius(self, x, y, radius):
+        """Returns candidates within the circle's bounding box; callers do the exact distance check."""
+        return self.query_rect(x - radius, y - radius, x + radius, y + radius)
+
+
+enemy_grid = SpatialHash(settings.spatial_cell_size)
+drop_grid = SpatialHash(settings.spatial_cell_size)
 
 
 def draw_text(surface, text, font, color, x, y, centered=False):
-    """Utility function to draw text on the screen."""
-    text_surface = font.render(text, True, color)
+    """Utility function to draw text on the screen; returns the area drawn over."""
+    text_surface = text_cache.render(text, font, color)
     text_rect = text_surface.get_rect()
     if centered:
         text_rect.center = (x, y)
     else:
         text_rect.topleft = (x, y)
-    surface.blit(text_surface, text_rect)
+    return surface.blit(text_surface, text_rect)
 
 
 def button(screen, text, x, y, w, h, inactive_color, active_color, action=None, font_size=FONT_SIZE, enabled=True):
@@ -626,7 +1990,7 @@ def button(screen, text, x, y, w, h, inactive_color, active_color, action=None,
     mouse = pygame.mouse.get_pos()
     click = pygame.mouse.get_pressed()
 
-    current_font = pygame.font.Font(None, font_size)
+    current_font = get_font(font_size)
 
     button_color = inactive_color
     if enabled:
@@ -641,18 +2005,27 @@ def button(screen, text, x, y, w, h, inactive_color, active_color, action=None,
     return False
 
 
+def buy_upgrade(player, upgrade_id):
+    """Gives the player an upgrade they can afford and don't own yet; returns whether it was bought."""
+    cost = settings.upgrade_costs[upgrade_id]
+    if player.coins >= cost and not player.upgrades[upgrade_id]:
+        player.upgrades[upgrade_id] = True
+        player.coins -= cost
+        return True
+    return False
+
+
 def upgrade_shop(player):
-    """Displays the upgrade shop."""
+    """Displays the upgrade shop and returns the ids of the upgrades bought."""
     message = ""
+    purchases = []
 
-    def buy_upgrade(upgrade_id):
+    def buy_upgrade_clicked(upgrade_id):
         nonlocal message
-        cost = GAME_SETTINGS['UPGRADE_COSTS'][upgrade_id]
-        if player.coins >= cost and not player.upgrades[upgrade_id]:
-            player.upgrades[upgrade_id] = True
-            player.coins -= cost
+        if buy_upgrade(player, upgrade_id):
+            purchases.append(upgrade_id)
             message = f"Purchased {upgrade_id.replace('_', ' ').title()}!"
-            if pickup_sfx: pickup_sfx.play()
+            voices.play(pickup_sfx, 'pickups')
         elif player.upgrades[upgrade_id]:
             message = "You already own this upgrade."
         else:
@@ -665,7 +2038,7 @@ def upgrade_shop(player):
                 sys.exit()
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_u:
-                    return  # Exit the shop and return to game
+                    return purchases  # Exit the shop and return to game
 
         screen.fill(GRAY_DARK)
         draw_text(screen, "Upgrade Shop", large_font, WHITE, SCREEN_WIDTH // 2, 50, centered=True)
@@ -678,23 +2051,23 @@ def upgrade_shop(player):
 
         # Rapid Fire Button
         if not player.upgrades['rapid_fire']:
-            button(screen, f"Rapid Fire ({GAME_SETTINGS['UPGRADE_COSTS']['rapid_fire']} coins)", upgrade_x, upgrade_y,
-                   200, 50, PURPLE, (120, 0, 200), lambda: buy_upgrade('rapid_fire'))
+            button(screen, f"Rapid Fire ({settings.upgrade_costs['rapid_fire']} coins)", upgrade_x, upgrade_y,
+                   200, 50, PURPLE, (120, 0, 200), lambda: buy_upgrade_clicked('rapid_fire'))
         else:
             button(screen, "Rapid Fire (Owned)", upgrade_x, upgrade_y, 200, 50, GRAY_LIGHT, GRAY_LIGHT, enabled=False)
 
         # Shield Upgrade Button (Shield drains slower)
         if not player.upgrades['shield_upgrade']:
-            button(screen, f"Shield Upgrade ({GAME_SETTINGS['UPGRADE_COSTS']['shield_upgrade']} coins)", upgrade_x,
-                   upgrade_y + 70, 200, 50, PURPLE, (120, 0, 200), lambda: buy_upgrade('shield_upgrade'))
+            button(screen, f"Shield Upgrade ({settings.upgrade_costs['shield_upgrade']} coins)", upgrade_x,
+                   upgrade_y + 70, 200, 50, PURPLE, (120, 0, 200), lambda: buy_upgrade_clicked('shield_upgrade'))
         else:
             button(screen, "Shield Upgrade (Owned)", upgrade_x, upgrade_y + 70, 200, 50, GRAY_LIGHT, GRAY_LIGHT,
                    enabled=False)
 
         # Bomb Gun Button
         if not player.upgrades['bomb_gun']:
-            button(screen, f"Bomb Gun ({GAME_SETTINGS['UPGRADE_COSTS']['bomb_gun']} coins)", upgrade_x, upgrade_y + 140,
-                   200, 50, PURPLE, (120, 0, 200), lambda: buy_upgrade('bomb_gun'))
+            button(screen, f"Bomb Gun ({settings.upgrade_costs['bomb_gun']} coins)", upgrade_x, upgrade_y + 140,
+                   200, 50, PURPLE, (120, 0, 200), lambda: buy_upgrade_clicked('bomb_gun'))
         else:
             button(screen, "Bomb Gun (Owned)", upgrade_x, upgrade_y + 140, 200, 50, GRAY_LIGHT, GRAY_LIGHT,
                    enabled=False)
@@ -703,6 +2076,7 @@ def upgrade_shop(player):
                   centered=True)
 
         pygame.display.flip()
+        voices.end_frame()
         clock.tick(60)
 
 def settings_menu():
@@ -751,46 +2125,61 @@ def settings_menu():
 
 def main_menu():
     """Displays the main menu screen."""
-    global unlocked_levels, current_level_number, background_music_enabled, menu_music_playing
+    global unlocked_levels, current_level_number, background_music_enabled, menu_music_playing, first_frame_time
+
+    # Only the menu's own assets hold up the first frame; the rest load in the background, starting
+    # with the highest unlocked level as that is the one most likely to be picked
+    assets.wait('menu')
+    assets.prefetch(load_level(min(max(unlocked_levels), level_count())).assets)
+    assets.prefetch('sprites')
+    assets.start()
 
     if background_music_enabled and not menu_music_playing and menu_music:
         pygame.mixer.music.load(menu_music)
         pygame.mixer.music.play(-1)
         menu_music_playing = True
 
+    total_levels = level_count()
+    pages = (total_levels + LEVELS_PER_PAGE - 1) // LEVELS_PER_PAGE
+    page = (min(max(unlocked_levels), total_levels) - 1) // LEVELS_PER_PAGE
+
     while True:
+        assets.poll()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    page = max(page - 1, 0)
+                elif event.key == pygame.K_RIGHT:
+                    page = min(page + 1, pages - 1)
 
         if menu_bg_image:
-            screen.blit(pygame.transform.scale(menu_bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT)), (0, 0))
+            screen.blit(sprite_cache.get(menu_bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT)), (0, 0))
         else:
             screen.fill(GRAY_DARK)
 
         draw_text(screen, "Loser", large_font, WHITE, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4,
                   centered=True)  # Changed title here
 
-        draw_text(screen, "Select a Level:", font, GRAY_LIGHT, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 80,
-                  centered=True)
+        prompt = "Select a Level:" if pages == 1 else f"Select a Level (page {page + 1}/{pages}, Left/Right for more):"
+        draw_text(screen, prompt, font, GRAY_LIGHT, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 80, centered=True)
 
         level_buttons_y = SCREEN_HEIGHT // 2 - 40
-        # Level 1 button
-        if button(screen, "Level 1", SCREEN_WIDTH // 2 - 100, level_buttons_y, 200, 50, GREEN, (0, 200, 0),
-                  lambda: run_game(1)):
-            current_level_number = 1
-            pygame.mixer.music.stop()
-            return
-
-        # Level 2 button
-        level_2_unlocked = 2 in unlocked_levels
-        if button(screen, "Level 2" if level_2_unlocked else "Level 2 (Locked)", SCREEN_WIDTH // 2 - 100,
-                  level_buttons_y + 60, 200, 50, GREEN if level_2_unlocked else GRAY_LIGHT, (0, 200, 0),
-                  lambda: run_game(2), enabled=level_2_unlocked):
-            current_level_number = 2
-            pygame.mixer.music.stop()
-            return
+        # Level buttons, two to a column, a page of LEVELS_PER_PAGE at a time
+        first = page * LEVELS_PER_PAGE + 1
+        page_levels = range(first, min(first + LEVELS_PER_PAGE, total_levels + 1))
+        columns = (len(page_levels) + 1) // 2
+        left = SCREEN_WIDTH // 2 - (columns * 220 - 20) // 2
+        for i, number in enumerate(page_levels):
+            unlocked = number in unlocked_levels
+            if button(screen, f"Level {number}" if unlocked else f"Level {number} (Locked)", left + i // 2 * 220,
+                      level_buttons_y + i % 2 * 60, 200, 50, GREEN if unlocked else GRAY_LIGHT, (0, 200, 0),
+                      lambda: run_game(number), enabled=unlocked):
+                current_level_number = number
+                pygame.mixer.music.stop()
+                return
 
         # Settings button
         if button(screen, "Settings", SCREEN_WIDTH // 2 - 100, level_buttons_y + 120, 200, 50, BLUE, (59, 100, 246),
@@ -804,9 +2193,23 @@ def main_menu():
                   SCREEN_HEIGHT - 80, centered=True)
 
         pygame.display.flip()
+        if first_frame_time is None:
+            first_frame_time = time.perf_counter() - STARTUP_TIME
+            if startup_report:
+                report_startup()
         clock.tick(60)
 
 
+def report_startup():
+    """Prints how long the first frame and each asset group took from start-up, then exits."""
+    print(f"First frame: {first_frame_time * 1000:.0f} ms")
+    assets.load_all()
+    for group, seconds in sorted(assets.load_times.items(), key=lambda item: item[1]):
+        print(f"{group} assets ready: {seconds * 1000:.0f} ms")
+    pygame.quit()
+    sys.exit()
+
+
 def game_over_screen(score, coins, upgrades, level_completed=False):
     """Displays the game over screen with stats."""
     global unlocked_levels, menu_music_playing
@@ -819,7 +2222,7 @@ def game_over_screen(score, coins, upgrades, level_completed=False):
     else:
         title = "MISSION FAILED"
         title_color = RED
-        if game_over_sfx: game_over_sfx.play()
+        voices.play(game_over_sfx, 'ui')
 
     if background_music_enabled and menu_music:
         pygame.mixer.music.load(menu_music)
@@ -854,251 +2257,636 @@ def game_over_screen(score, coins, upgrades, level_completed=False):
         clock.tick(60)
 
 
-def run_game(level_num):
-    """The main game loop and logic."""
-    global boss_active, enemies_destroyed_in_level, total_enemies_for_level, boss_attack_timer, current_boss_attack, background_music_enabled, menu_music_playing
+class GameClock:
+    """Game time in milliseconds, kept separate from wall time.
+
+    With a time_source (pygame.time.get_ticks by default) tick() advances game time by the
+    real time since the last tick; with time_source=None the clock only moves when advance()
+    is called, for headless runs and replays. Game time can be paused and scaled for
+    slow motion or fast-forward either way.
+    """
+
+    def __init__(self, time_source=pygame.time.get_ticks, scale=1.0):
+        self.time_source = time_source
+        self.scale = scale
+        self.now = 0.0
+        self.paused = False
+        self.last_real_time = time_source() if time_source else 0
+
+    def tick(self):
+        """Advances game time by the (scaled) real time since the last tick and returns it."""
+        real_time = self.time_source()
+        self.advance(real_time - self.last_real_time)
+        self.last_real_time = real_time
+        return self.now
+
+    def advance(self, ms):
+        """Advances game time by ms of (scaled) time unless the clock is paused."""
+        if not self.paused:
+            self.now += ms * self.scale
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        """Resumes the clock; real time that passed while paused is not counted."""
+        self.paused = False
+        if self.time_source:
+            self.last_real_time = self.time_source()
+
+
+# --- Frame Profiler ---
+def skip_mark(phase):
+    """Stands in for FrameProfiler.mark when a session is stepped without profiling."""
+
+
+class FrameProfiler:
+    """Times each phase of the game loop and draws the results as an overlay.
+
+    The loop calls begin_frame() first, mark(phase) after each phase and end_frame() once the
+    frame is done; timings for the last `history` frames are kept in a ring buffer. The overlay is
+    rendered to a cached surface that is only redrawn every `refresh_ms`, so showing it costs a
+    single blit most frames. capture() records the next frames with cProfile and dumps them to disk.
+    """
+
+    PHASES = ('input', 'spawn', 'boss', 'update', 'collision', 'cleanup', 'draw', 'hud', 'flip')
+    WIDTH = 260
+    GRAPH_HEIGHT = 60
+    GRAPH_MAX_MS = 50  # Frame time at the top of the graph
+
+    def __init__(self, history, refresh_ms, capture_frames):
+        self.history = history
+        self.refresh_ms = refresh_ms
+        self.capture_frames = capture_frames
+        self.phase_index = {phase: i for i, phase in enumerate(self.PHASES)}
+        self.phase_times = np.zeros((history, len(self.PHASES)))
+        self.frame_times = np.zeros(history)
+        self.frames = 0
+        self.current = np.zeros(len(self.PHASES))
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.visible = False
+        self.surface = None
+        self.last_refresh = 0
+        self.profile = None
+        self.capture_left = 0
+
+    def begin_frame(self):
+        """Starts timing a frame; also used to restart it after a pause such as the shop."""
+        self.current[:] = 0
+        self.frame_start = self.last_mark = time.perf_counter()
+
+    def mark(self, phase):
+        """Adds the time since the previous mark to the given phase."""
+        now = time.perf_counter()
+        self.current[self.phase_index[phase]] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self):
+        """Stores the finished frame's timings, including time spent waiting for the frame cap."""
+        row = self.frames % self.history
+        self.phase_times[row] = self.current
+        self.frame_times[row] = time.perf_counter() - self.frame_start
+        self.frames += 1
+        if self.profile:
+            self.capture_left -= 1
+            if self.capture_left <= 0:
+                self.finish_capture()
+
+    def capture(self, frames=None):
+        """Starts recording the next frames with cProfile."""
+        if self.profile:
+            return
+        self.capture_left = frames or self.capture_frames
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def finish_capture(self):
+        """Stops a running capture and writes it where pstats/snakeviz can read it."""
+        self.profile.disable()
+        path = time.strftime('profile-%Y%m%d-%H%M%S.prof')
+        self.profile.dump_stats(path)
+        print(f"Wrote cProfile capture to {path}")
+        self.profile = None
+        self.last_refresh = 0
+
+    def toggle(self):
+        """Shows or hides the overlay."""
+        self.visible = not self.visible
+        self.last_refresh = 0
+
+    def draw(self, screen, session, fps):
+        """Blits the overlay, redrawing its cached surface if it is older than refresh_ms.
+
+        Returns the area drawn over, or None while the overlay is hidden.
+        """
+        if not self.visible:
+            return None
+        now = pygame.time.get_ticks()
+        if self.surface is None or now - self.last_refresh >= self.refresh_ms:
+            self.surface = self.render(session, fps)
+            self.last_refresh = now
+        return screen.blit(self.surface, (SCREEN_WIDTH - self.WIDTH - 10, 35))
+
+    def render(self, session, fps):
+        """Draws the graph, phase times, entity counts and cache/pool stats onto a new surface."""
+        count = min(self.frames, self.history)
+        frame_ms = self.frame_times[:count] * 1000
+        phase_ms = self.phase_times[:count].mean(axis=0) * 1000 if count else self.current
+
+        lines = [f"FPS {fps:.1f}   frame {frame_ms.mean() if count else 0:.1f} ms, "
+                 f"max {frame_ms.max() if count else 0:.1f} ms"]
+        lines += [f"{phase:<10}{ms:6.2f} ms" for phase, ms in zip(self.PHASES, phase_ms)]
+        lines += [f"{name:<14}{n}" for name, n in session.entity_counts().items()]
+        text_stats = text_cache.stats()
+        lines.append(f"text cache {text_stats['hits']} hits / {text_stats['misses']} misses")
+        sprite_stats = sprite_cache.stats()
+        lines.append(f"sprite cache {sprite_stats['hits']} hits / {sprite_stats['misses']} misses")
+        lines += [f"{name:<13}{stats['in_use']} used, {stats['free']} free, {stats['peak']} peak"
+                  for name, stats in pool_stats().items()]
+        for name, store in (('Bullets', session.bullets), ('EnemyBullets', session.enemy_bullets)):
+            stats = store.stats()
+            lines.append(f"{name:<13}{stats['in_use']} used, {stats['peak']} peak")
+        voice_stats = voices.stats()
+        lines.append(f"sounds {voice_stats['played']} played, {voice_stats['deduplicated']} merged, "
+                     f"{voice_stats['stolen']} stolen")
+        if self.profile:
+            lines.append(f"cProfile: {self.capture_left} frames left")
+
+        overlay_font = get_font(16)
+        line_height = overlay_font.get_linesize()
+        surface = pygame.Surface((self.WIDTH, self.GRAPH_HEIGHT + 10 + line_height * len(lines)), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+
+        # Frame-time graph, oldest frame on the left, with a line at the 60 FPS budget
+        scale = self.GRAPH_HEIGHT / self.GRAPH_MAX_MS
+        budget_y = self.GRAPH_HEIGHT - 1000 / 60 * scale
+        pygame.draw.line(surface, GREEN, (0, budget_y), (self.WIDTH, budget_y))
+        if count > 1:
+            ordered = np.roll(frame_ms, -(self.frames % self.history)) if count == self.history else frame_ms
+            xs = np.linspace(0, self.WIDTH - 1, count)
+            ys = self.GRAPH_HEIGHT - np.minimum(ordered, self.GRAPH_MAX_MS) * scale
+            pygame.draw.lines(surface, YELLOW, False, list(zip(xs, ys)))
+
+        y = self.GRAPH_HEIGHT + 5
+        for line in lines:
+            surface.blit(overlay_font.render(line, True, WHITE), (5, y))
+            y += line_height
+        return surface
+
+
+# --- Dirty-Rect Renderer ---
+class DirtyRectRenderer:
+    """Redraws and pushes to the display only the parts of the window that changed.
+
+    Each frame the areas entities covered in the previous frame are restored from the level
+    background, every entity is drawn again, and only the old and new areas are sent to the
+    display with pygame.display.update(rects) instead of flipping the whole window. The HUD is
+    kept on its own layer that is only re-rendered when the values it shows change; its areas
+    are restored and composited every frame so entities passing under it stay correct.
+    """
 
-    # Play level music
-    if background_music_enabled:
-        music_file = level1_music if level_num == 1 else level2_music
-        if music_file:
-            pygame.mixer.music.load(music_file)
-            pygame.mixer.music.play(-1)
-    menu_music_playing = False
+    def __init__(self):
+        self.hud_layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self.hud_state = None
+        self.hud_rects = []
+        self.black_background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.black_background.fill(BLACK)
+        self.background = None
+        self.previous = []  # Areas drawn over last frame, restored before drawing the next one
+        self.current = []
+        self.dirty = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Makes the next frame redraw and push the whole window, e.g. after a menu covered it."""
+        self.full_redraw = True
+
+    def draw(self, screen, session, alpha=1.0):
+        """Draws the session's world and HUD, remembering which areas have to be pushed."""
+        background = session.background() or self.black_background
+        if background is not self.background:
+            self.background = background
+            self.full_redraw = True
+
+        hud_state = session.hud_state()
+        changed_hud_rects = []
+        if hud_state != self.hud_state or self.full_redraw:
+            # Push both where the HUD was and where it is now, in case something got shorter or went away
+            self.hud_layer.fill((0, 0, 0, 0))
+            changed_hud_rects = self.hud_rects
+            self.hud_rects = session.draw_hud(self.hud_layer)
+            changed_hud_rects = changed_hud_rects + self.hud_rects
+            self.hud_state = hud_state
+
+        if self.full_redraw:
+            screen.blit(background, (0, 0))
+            self.current = session.draw_entities(screen, alpha)
+            screen.blit(self.hud_layer, (0, 0))
+            return
 
-    player = Player()
-    bullets = []
-    enemies = []
-    enemy_bullets = []
-    drops = []
-    explosions = []
-    lasers = []
-    laser_warnings = []  # New list for laser warnings
-
-    score = 0
-    level = level_num
-    enemies_spawned_in_level = 0
-    total_enemies_for_level = GAME_SETTINGS[f'LEVEL_{level}_TOTAL_ENEMIES']
-
-    last_air_spawn = pygame.time.get_ticks()
-    last_ground_spawn = pygame.time.get_ticks()
-    last_medic_spawn = pygame.time.get_ticks()
-    last_fire = pygame.time.get_ticks()
-
-    boss_active = False
-    enemies_destroyed_in_level = 0
-    boss_attack_timer = pygame.time.get_ticks()
-    boss_attack_cooldown = 3000  # Time between boss attacks
-
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_u:
-                    upgrade_shop(player)
+        for rect in self.previous:
+            screen.blit(background, rect, rect)
+        for rect in changed_hud_rects or self.hud_rects:
+            screen.blit(background, rect, rect)
+        self.current = session.draw_entities(screen, alpha)
+        for rect in self.hud_rects:
+            screen.blit(self.hud_layer, rect, rect)
+        self.dirty = self.previous + self.current + changed_hud_rects
+
+    def add(self, rect):
+        """Includes an area drawn over after draw() (such as an overlay) in this frame's update."""
+        if rect:
+            self.current.append(rect)
+            self.dirty.append(rect)
+
+    def present(self):
+        """Pushes the changed areas (or, after invalidate(), the whole window) to the display."""
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.dirty)
+        self.previous = self.current
+        self.dirty = []
 
-        # --- Input Handling ---
-        keys = pygame.key.get_pressed()
-        mouse_pos = pygame.mouse.get_pos()
-        player.update(keys, mouse_pos)
 
-        # Player firing
-        now = pygame.time.get_ticks()
-        fire_rate = GAME_SETTINGS['RAPID_FIRE_RATE'] if player.upgrades['rapid_fire'] else GAME_SETTINGS[
-            'STANDARD_FIRE_RATE']
-        if pygame.mouse.get_pressed()[0] and now - last_fire > fire_rate:
-            bullets.append(Bullet(player.x, player.y, player.cannon_angle, GAME_SETTINGS['PLAYER_BULLET_SPEED'],
-                                  GAME_SETTINGS['BOMB_BULLET_DAMAGE'] if player.upgrades['bomb_gun'] else GAME_SETTINGS
-                                  ['PLAYER_BULLET_DAMAGE'],
-                                  is_bomb=player.upgrades['bomb_gun']))
-            if player_fire_sfx: player_fire_sfx.play()  # Play firing sound
-            last_fire = now
-
-        # --- Enemy Spawning ---
-        # Spawning for regular enemies is now capped by total_enemies_for_level
-        if enemies_spawned_in_level < total_enemies_for_level and not boss_active:
-            if len([e for e in enemies if e.type not in ['boss', 'medic_helicopter']]) < GAME_SETTINGS[
-                'MAX_ENEMIES_ON_SCREEN']:
-                if now - last_air_spawn > GAME_SETTINGS['ENEMY_AIR_SPAWN_RATE']:
-                    enemy_type = 'helicopter' if random.random() > 0.5 else 'jet'
-                    start_x = 0 if random.random() > 0.5 else SCREEN_WIDTH
-                    speed = 2 if level == 1 else 3
-                    health = 10 if enemy_type == 'helicopter' else 20
-                    enemies.append \
-                        (Enemy(enemy_type, start_x, random.uniform(SCREEN_HEIGHT * 0.1, SCREEN_HEIGHT * 0.5), speed,
-                               health, 50, 30, True, level))
-                    last_air_spawn = now
-                    enemies_spawned_in_level += 1
-
-                if level >= 2 and now - last_ground_spawn > GAME_SETTINGS['ENEMY_GROUND_SPAWN_RATE']:
-                    start_x = 0 if random.random() > 0.5 else SCREEN_WIDTH
-                    speed = 1 if level == 2 else 1.5
-                    enemies.append(Enemy('tank', start_x, SCREEN_HEIGHT - 40, speed, 50, 80, 40, True, level))
-                    last_ground_spawn = now
-                    enemies_spawned_in_level += 1
-
-        if not boss_active:
-            if now - last_medic_spawn > GAME_SETTINGS['MEDIC_SPAWN_RATE']:
-                start_x = 0 if random.random() > 0.5 else SCREEN_WIDTH
-                speed = 3
-                enemies.append \
-                    (Enemy('medic_helicopter', start_x, random.uniform(SCREEN_HEIGHT * 0.1, SCREEN_HEIGHT * 0.5), speed, 1,
-                           50, 30, False, 1))
-                last_medic_spawn = now
+class SessionDrawing:
+    """Drawing shared by a live GameSession and the SessionSnapshots taken of it.
 
+    Only reads the entity lists, boss, score, level, level_info, now and progress(), which both classes provide.
+    """
 
+    def background(self):
+        """Returns the level's scaled background image, or None to draw a black background."""
+        image = globals()[self.level_info.background]
+        if image:
+            return sprite_cache.get(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        return None
+
+    def draw_world(self, screen, alpha=1.0):
+        """Draws the background and every entity."""
+        background = self.background()
+        if background:
+            screen.blit(background, (0, 0))
+        else:
+            screen.fill(BLACK)
+        self.draw_entities(screen, alpha)
+
+    def draw_entities(self, screen, alpha=1.0):
+        """Draws every entity and returns the areas drawn over.
+
+        alpha is how far the frame is between the last two ticks (0 to 1); moving entities are
+        drawn that far between their previous and current positions.
+        """
+        now = self.now
+        rects = [self.player.draw(screen, alpha)]
+        rects += self.bullets.draw(screen, alpha)
+        for enemy in self.enemies:
+            rects.append(enemy.draw(screen, alpha))
+        rects += self.enemy_bullets.draw(screen, alpha)
+        for drop in self.drops:
+            rects.append(drop.draw(screen, alpha))
+
+        for exp in self.explosions:
+            rects.append(exp.draw(screen, now))
+
+        for laser in self.lasers:
+            rects.append(laser.draw(screen))
+        for warning in self.laser_warnings:
+            rect = warning.draw(screen, now)
+            if rect:
+                rects.append(rect)
+        return rects
+
+    def hud_state(self):
+        """Returns the values shown by the HUD, so callers can tell when it needs redrawing."""
+        player = self.player
+        _, destroyed, _ = self.progress()
+        boss = self.boss
+        boss_health = boss.health if boss is not None else None
+        return (self.score, player.coins, self.level, player.health, player.shield_meter, destroyed, boss_health)
+
+    def draw_hud(self, screen):
+        """Draws the score, meters, progress and boss health bars and returns the areas drawn over."""
+        player = self.player
+        _, destroyed, total = self.progress()
+        rects = [draw_text(screen, f"Score: {self.score}", hud_font, YELLOW, 10, 10),
+                 draw_text(screen, f"Coins: {player.coins}", hud_font, YELLOW, 10, 35),
+                 draw_text(screen, f"Level: {self.level}", hud_font, YELLOW, 10, 60),
+                 draw_text(screen, f"Health: {player.health}%", hud_font, YELLOW, 10, 85)]
+
+        # Draw Shield Meter
+        shield_bar_width = 150
+        shield_bar_height = 15
+        shield_bar_x = 10
+        shield_bar_y = 110
+        rects.append(pygame.draw.rect(screen, GRAY_LIGHT,
+                                      (shield_bar_x, shield_bar_y, shield_bar_width, shield_bar_height),
+                                      border_radius=5))
+        fill_width = (player.shield_meter / settings.shield_meter_max) * shield_bar_width
+        pygame.draw.rect(screen, BLUE, (shield_bar_x, shield_bar_y, fill_width, shield_bar_height), border_radius=5)
+        rects.append(draw_text(screen, f"Shield: {int(player.shield_meter)}%", font, WHITE,
+                               shield_bar_x + shield_bar_width // 2, shield_bar_y + shield_bar_height // 2,
+                               centered=True))
+
+        # Draw Progress Bar
+        progress_bar_width = 200
+        progress_bar_height = 15
+        progress_bar_x = SCREEN_WIDTH - progress_bar_width - 10
+        progress_bar_y = 10
+        rects.append(pygame.draw.rect(screen, GRAY_LIGHT,
+                                      (progress_bar_x, progress_bar_y, progress_bar_width, progress_bar_height),
+                                      border_radius=5))
+        if total > 0:
+            fill_width = (destroyed / total) * progress_bar_width
+            if fill_width > progress_bar_width:
+                fill_width = progress_bar_width  # Don't exceed the bar length
+            pygame.draw.rect(screen, GREEN, (progress_bar_x, progress_bar_y, fill_width, progress_bar_height),
+                             border_radius=5)
+        rects.append(draw_text(screen, f"Progress: {destroyed}/{total}", font, WHITE,
+                               progress_bar_x + progress_bar_width // 2, progress_bar_y + progress_bar_height // 2,
+                               centered=True))
 
+        # Boss health bar
+        boss = self.boss
+        if boss is not None:
+            boss_bar_width = SCREEN_WIDTH - 20
+            boss_bar_height = 20
+            boss_bar_x = 10
+            boss_bar_y = SCREEN_HEIGHT - 30
+            rects.append(pygame.draw.rect(screen, GRAY_LIGHT, (boss_bar_x, boss_bar_y, boss_bar_width, boss_bar_height)))
+            fill_width = (boss.health / self.level_info.boss_health) * boss_bar_width
+            pygame.draw.rect(screen, RED, (boss_bar_x, boss_bar_y, fill_width, boss_bar_height))
+            draw_text(screen, "BOSS", font, WHITE, SCREEN_WIDTH // 2, boss_bar_y + boss_bar_height // 2, centered=True)
+        return rects
+
+    def entity_counts(self):
+        """Returns the number of live entities in each list."""
+        return {'enemies': len(self.enemies), 'bullets': len(self.bullets), 'enemy bullets': len(self.enemy_bullets),
+                'drops': len(self.drops), 'explosions': len(self.explosions), 'lasers': len(self.lasers),
+                'warnings': len(self.laser_warnings)}
+
+
+# Something the collision pass found that changes the game state beyond an enemy's health: an
+# enemy the player killed ('kill', at its position) or a player bomb going off ('blast', with no enemy).
+# GameSession queues them during collision checks and applies them all in resolve_events().
+CombatEvent = namedtuple('CombatEvent', ['kind', 'enemy', 'x', 'y'])
+
+
+class GameSession(SessionDrawing):
+    """The state and simulation of one level, independent of the window, input devices and audio.
+
+    step() advances the simulation by one tick using a TickInput and the time on the session's
+    GameClock, so the same code runs in the windowed game and in headless runs. All randomness
+    comes from the session's own RNG, so a seed plus the recorded input reproduces a run exactly.
+    """
+
+    def __init__(self, level_num, game_clock, headless=False, seed=None):
+        self.level = level_num
+        self.level_info = level = load_level(level_num)
+        self.headless = headless  # No sounds are played in headless runs
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.clock = game_clock
+        self.now = now = game_clock.now  # Read once per tick and handed to the entities
+        self.running = True
+
+        self.player = Player()
+        self.bullets = ProjectileStore(from_player=True)
+        self.enemy_bullets = ProjectileStore(from_player=False)
+        self.world = world = EntityWorld()
+        # The world's lists under the names SessionDrawing reads
+        self.enemies = world.enemies
+        self.drops = world.drops
+        self.explosions = world.explosions
+        self.lasers = world.lasers
+        self.laser_warnings = world.laser_warnings
+        self.events = []  # This tick's CombatEvents, waiting for resolve_events()
+
+        self.score = 0
+        self.damage_taken = 0  # Health lost, for balance statistics
+        self.boss_spawn_time = None  # Game time the boss appeared at, for balance statistics
+        # Regular waves wait while the on-screen cap is reached; the others (medics) never do
+        self.spawns = SpawnSchedule([wave for wave in level.waves if wave.regular], now)
+        self.uncapped_spawns = SpawnSchedule([wave for wave in level.waves if not wave.regular], now)
+
+        self.last_fire = now
+
+        self.boss_attack_timer = now
+        self.boss_attack_cooldown = 3000  # Time between boss attacks
+        self.current_boss_attack = 'bullets'
+
+    def play_sound(self, sound, category):
+        """Plays a sound effect through the voice manager unless the session is headless."""
+        if not self.headless:
+            voices.play(sound, category)
+
+    def step(self, tick_input, mark=None):
+        """Advances the simulation by one tick at the clock's current time.
+
+        If given, mark is called with the name of each phase as it finishes (see FrameProfiler).
+        """
+        self.now = self.clock.now
+        if mark is None:
+            mark = skip_mark
+        self.handle_input(tick_input)
+        mark('input')
+        self.spawn_enemies()
+        mark('spawn')
+        self.boss_logic()
+        mark('boss')
+        self.update_entities()
+        mark('update')
+        self.check_collisions()
+        mark('collision')
+        self.cleanup()
+        mark('cleanup')
+
+    @property
+    def boss(self):
+        """The boss Enemy while it is alive, otherwise None."""
+        return self.world.boss
+
+    def progress(self):
+        """Returns whether the boss fight has started, the enemies destroyed and the level's enemy total."""
+        return self.world.boss_fight, self.world.destroyed, self.level_info.total_enemies
+
+    def handle_input(self, tick_input):
+        """Moves and aims the player and fires the cannon."""
+        player = self.player
+        player.update(tick_input)
 
+        # Player firing
+        fire_rate = settings.rapid_fire_rate if player.upgrades['rapid_fire'] else settings.standard_fire_rate
+        if tick_input.fire and self.now - self.last_fire > fire_rate:
+            self.bullets.spawn_aimed(player.x, player.y, player.cannon_angle, settings.player_bullet_speed,
+                                     settings.bomb_bullet_damage if player.upgrades['bomb_gun'] else
+                                     settings.player_bullet_damage,
+                                     is_bomb=player.upgrades['bomb_gun'])
+            self.play_sound(player_fire_sfx, 'weapons')  # Play firing sound
+            self.last_fire = self.now
+
+    def spawn_enemies(self):
+        """Spawns the wave enemies that are due and, once enough enemies are destroyed, the boss."""
+        world = self.world
+        if world.boss_fight:
+            return  # Waves end when the boss appears
+        now = self.now
+        level = self.level_info
+        max_on_screen = level.max_on_screen if level.max_on_screen is not None else settings.max_enemies_on_screen
+        for spawns, capped in ((self.spawns, True), (self.uncapped_spawns, False)):
+            wave = spawns.due(now)
+            # A full screen holds back the earliest regular spawn, and with it every later one
+            while wave is not None and not (capped and world.regular_count >= max_on_screen):
+                spawns.take(now)
+                kind = self.rng.choice(wave.kinds)
+                start_x = 0 if self.rng.random() > 0.5 else SCREEN_WIDTH
+                world.add_enemy(Enemy(now, kind, start_x, kind.spawn_y(self.rng), wave.speed, kind.health,
+                                      *kind.size, True, level.enemy_fire_rate, self.rng))
+                wave = spawns.due(now)
 
         # Boss spawning logic: check if enough enemies are destroyed
-        if enemies_destroyed_in_level >= total_enemies_for_level and not boss_active:
-            boss_health = GAME_SETTINGS[f'BOSS_HEALTH_L{level}']
-            boss_size = 150
-            enemies.append \
-                (Enemy('boss', SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, 1, boss_health, boss_size, boss_size, True,
-                       level))
-            boss_active = True
-            boss_attack_timer = now
-
-        # --- Boss Attack Logic (State Machine) ---
-        # Only run boss logic if there is a boss in the enemies list
-        if boss_active and enemies:
-            boss = enemies[0]
-            if now - boss_attack_timer > boss_attack_cooldown:
+        if world.destroyed >= level.total_enemies:
+            kind = ENEMY_TYPES['boss']
+            world.add_enemy(Enemy(now, kind, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, level.boss_speed,
+                                  level.boss_health, *kind.size, True, level.enemy_fire_rate, self.rng))
+            self.boss_spawn_time = now
+            self.boss_attack_timer = now
+
+    def boss_logic(self):
+        """Runs the boss attack state machine."""
+        now = self.now
+        player = self.player
+        boss = self.world.boss
+        if boss is not None:
+            if now - self.boss_attack_timer > self.boss_attack_cooldown:
                 # Cycle through attack patterns
-                if current_boss_attack == 'bullets':
-                    current_boss_attack = 'bombs'
-                elif current_boss_attack == 'bombs':
-                    current_boss_attack = 'laser'
+                if self.current_boss_attack == 'bullets':
+                    self.current_boss_attack = 'bombs'
+                elif self.current_boss_attack == 'bombs':
+                    self.current_boss_attack = 'laser'
                     # When switching to laser, create a warning instead of a laser
-                    laser_warnings.append(LaserWarning((boss.x, boss.y), (player.x, player.y)))
-                elif current_boss_attack == 'laser':
-                    current_boss_attack = 'bullets'
+                    self.laser_warnings.add(laser_warning_pool.acquire(now, (boss.x, boss.y), (player.x, player.y)))
+                elif self.current_boss_attack == 'laser':
+                    self.current_boss_attack = 'bullets'
 
-                boss_attack_timer = now
+                self.boss_attack_timer = now
 
-            if current_boss_attack == 'bullets' and now - boss.last_fire_time > 200:
+            if self.current_boss_attack == 'bullets' and now - boss.last_fire_time > 200:
                 angle = math.atan2(player.y - boss.y, player.x - boss.x)
-                enemy_bullets.append(Bullet(boss.x, boss.y, angle, GAME_SETTINGS['ENEMY_BULLET_SPEED'] * 1.5,
-                                            GAME_SETTINGS['BOSS_BULLET_DAMAGE'], from_player=False))
+                self.enemy_bullets.spawn_aimed(boss.x, boss.y, angle, settings.enemy_bullet_speed * 1.5,
+                                               settings.boss_bullet_damage)
                 boss.last_fire_time = now
-            elif current_boss_attack == 'bombs' and now - boss.last_fire_time > 1000:
-                enemy_bullets.append(BombBullet(boss.x, boss.y, GAME_SETTINGS['BOSS_BOMB_DAMAGE']))
+            elif self.current_boss_attack == 'bombs' and now - boss.last_fire_time > 1000:
+                self.enemy_bullets.spawn_bomb(boss.x, boss.y, settings.boss_bomb_damage)
                 boss.last_fire_time = now
-            elif current_boss_attack == 'laser' and not laser_warnings and not lasers:  # Fire the laser only after the warning is gone
-                lasers.append(Laser((boss.x, boss.y), (player.x, player.y)))
+            elif self.current_boss_attack == 'laser' and not self.laser_warnings and not self.lasers:  # Fire the laser only after the warning is gone
+                self.lasers.add(laser_pool.acquire(now, (boss.x, boss.y), (player.x, player.y)))
 
-        # --- Update Game Objects ---
-        for bullet in bullets:
-            bullet.update()
+    def update_entities(self):
+        """Moves every entity and lets enemies fire."""
+        now = self.now
+        player = self.player
+        self.bullets.update()
 
-        for enemy in enemies:
+        for enemy in self.enemies:
             enemy.update()
-            if enemy.type != 'boss' and enemy.can_fire:
-                new_bullets = enemy.fire(player.x, player.y)
-                enemy_bullets.extend(new_bullets)
+            if enemy.can_fire:
+                enemy.fire(player.x, player.y, self.enemy_bullets, now)
 
-        for e_bullet in enemy_bullets:
-            e_bullet.update()
+        self.enemy_bullets.update()
 
+        # Whatever finishes this tick is retired here and removed by cleanup()
+        drops = self.drops
         for drop in drops:
-            drop.update()
+            drop.update(now)
+            if drop.done:
+                drops.retire(drop)
 
-        for laser in lasers:
-            laser.draw(screen)
-        for warning in laser_warnings:
-            warning.draw(screen)
+        explosions = self.explosions
+        for exp in explosions:
+            exp.update(now)
+            if exp.done:
+                explosions.retire(exp)
+
+        for items in (self.lasers, self.laser_warnings):
+            for item in items:
+                item.update(now)
+                if item.done:
+                    items.retire(item)
+
+    def check_collisions(self):
+        """Resolves bullet, bomb, laser and pickup collisions."""
+        now = self.now
+        player = self.player
+        enemies = self.enemies
+        bullets = self.bullets
+        enemy_bullets = self.enemy_bullets
+        drops = self.drops
+        explosions = self.explosions
 
         # --- Collision Detection (Player Bullets vs Enemies) ---
-        for bullet in bullets[:]:
-            for enemy in enemies[:]:
-                if (bullet.x > enemy.x - enemy.width // 2 and
-                        bullet.x < enemy.x + enemy.width // 2 and
-                        bullet.y > enemy.y - enemy.height // 2 and
-                        bullet.y < enemy.y + enemy.height // 2):
-
-                    if enemy.type == 'medic_helicopter':
-                        score += GAME_SETTINGS['SCORES']['medic_helicopter']
-                        player.coins += GAME_SETTINGS['COIN_VALUES']['medic_helicopter']
-                        explosions.append(Explosion(enemy.x, enemy.y, 50))
-                        if enemy_explosion_sfx: enemy_explosion_sfx.play()  # Play explosion sound
-                        enemies.remove(enemy)
-                        bullets.remove(bullet)
-                        continue  # Skip to next enemy
-
-                    if bullet.is_bomb:
-                        # Bomb explosion AOE
-                        for e in enemies[:]:
-                            distance = math.sqrt((e.x - bullet.x) ** 2 + (e.y - bullet.y) ** 2)
-                            if distance < GAME_SETTINGS['BOMB_AOE']:
-                                e.health -= bullet.damage
-                                if e.health <= 0 and e.type != 'medic_helicopter':
-                                    # Handle drops for destroyed enemies
-                                    if random.random() < GAME_SETTINGS['ENEMY_DROP_CHANCES']['coin']:
-                                        drops.append(Drop('coin', e.x, e.y))
-                                    if random.random() < GAME_SETTINGS['ENEMY_DROP_CHANCES']['shield']:
-                                        drops.append(Drop('shield', e.x, e.y))
-
-                                    if e.type == 'boss':  # Don't increment for boss
-                                        pass
-                                    else:
-                                        enemies_destroyed_in_level += 1
-
-                                    enemies.remove(e)
-                                    score += GAME_SETTINGS['SCORES'].get(e.type, 10)
-                                    player.coins += GAME_SETTINGS['COIN_VALUES'].get(e.type, 5)
-                                    explosions.append(Explosion(e.x, e.y, 50))
-                                    if enemy_explosion_sfx: enemy_explosion_sfx.play()
-
-                        explosions.append(Explosion(bullet.x, bullet.y, GAME_SETTINGS['BOMB_AOE'], bomb=True))
-                    else:
-                        enemy.health -= bullet.damage
-                        if enemy.health <= 0:
-                            # Handle drops for destroyed enemies
-                            if random.random() < GAME_SETTINGS['ENEMY_DROP_CHANCES']['coin']:
-                                drops.append(Drop('coin', enemy.x, enemy.y))
-                            if random.random() < GAME_SETTINGS['ENEMY_DROP_CHANCES']['shield']:
-                                drops.append(Drop('shield', enemy.x, enemy.y))
-
-                            if enemy.type == 'boss':  # Don't increment for boss
-                                pass
-                            else:
-                                enemies_destroyed_in_level += 1
-
-                            enemies.remove(enemy)
-                            score += GAME_SETTINGS['SCORES'].get(enemy.type, 10)
-                            player.coins += GAME_SETTINGS['COIN_VALUES'].get(enemy.type, 5)
-                            explosions.append(Explosion(enemy.x, enemy.y, 50))
-                            if enemy_explosion_sfx: enemy_explosion_sfx.play()
-
-                    bullets.remove(bullet)
-                    break  # Bullet can only hit one enemy
+        # Enemies go into the spatial hash so bomb blasts only check the ones near them
+        enemy_grid.clear()
+        for enemy in enemies:
+            enemy_grid.insert_rect(enemy, enemy.x - enemy.width // 2, enemy.y - enemy.height // 2,
+                                   enemy.x + enemy.width // 2, enemy.y + enemy.height // 2)
 
-        # --- Collision Detection (Enemy Bullets vs Player) ---
-        for e_bullet in enemy_bullets[:]:
-            if (e_bullet.x > player.x - player.width // 2 and
-                    e_bullet.x < player.x + player.width // 2 and
-                    e_bullet.y > player.y - player.height // 2 and
-                    e_bullet.y < player.y + player.height // 2):
+        bomb_aoe = settings.bomb_aoe
+        for enemy in enemies:
+            # One vectorized test finds every live bullet inside this enemy
+            for i in bullets.hits_in_rect(enemy.x - enemy.width // 2, enemy.y - enemy.height // 2,
+                                          enemy.x + enemy.width // 2, enemy.y + enemy.height // 2):
+                if enemy.destroyed:
+                    break
+                if not bullets.is_alive(i):
+                    continue  # Already used up on another enemy this tick
+                bullets.kill(i)  # Bullet can only hit one enemy
+
+                if enemy.kind.is_medic:
+                    self.kill(enemy)  # Any hit downs a medic, which resolve_events() penalizes
+                    continue
+
+                bullet_x = float(bullets.x[i])
+                bullet_y = float(bullets.y[i])
+                damage = int(bullets.damage[i])
+                if bullets.flags[i] & ProjectileStore.BOMB:
+                    # Bomb explosion AOE, only checking enemies in the grid cells the blast covers
+                    for e in enemy_grid.query_radius(bullet_x, bullet_y, bomb_aoe):
+                        if e.destroyed:
+                            continue
+                        if (e.x - bullet_x) ** 2 + (e.y - bullet_y) ** 2 < bomb_aoe ** 2:
+                            e.health -= damage
+                            if e.health <= 0 and not e.kind.is_medic:
+                                self.kill(e)
+                    self.events.append(CombatEvent('blast', None, bullet_x, bullet_y))
+                else:
+                    enemy.health -= damage
+                    if enemy.health <= 0:
+                        self.kill(enemy)
 
-                if player.shield_active:
-                    # Player shield absorbs damage
-                    player.shield_meter -= e_bullet.damage
-                    if player.shield_meter <= 0:
-                        player.shield_meter = 0
-                        player.shield_active = False
+        self.resolve_events()
 
-                else:
-                    player.health -= e_bullet.damage
+        # --- Collision Detection (Enemy Bullets vs Player) ---
+        for i in enemy_bullets.hits_in_rect(player.x - player.width // 2, player.y - player.height // 2,
+                                            player.x + player.width // 2, player.y + player.height // 2):
+            damage = int(enemy_bullets.damage[i])
+            if player.shield_active:
+                # Player shield absorbs damage
+                player.shield_meter -= damage
+                if player.shield_meter <= 0:
+                    player.shield_meter = 0
+                    player.shield_active = False
 
-                explosions.append(Explosion(e_bullet.x, e_bullet.y, 20))
-                enemy_bullets.remove(e_bullet)
+            else:
+                player.health -= damage
+                self.damage_taken += damage
+
+            explosions.add(explosion_pool.acquire(now, float(enemy_bullets.x[i]), float(enemy_bullets.y[i]), 20))
+            enemy_bullets.kill(i)
 
         # --- Collision Detection (Laser vs Player) ---
-        for laser in lasers[:]:
+        for laser in self.lasers:
             # Check for collision with the player's bounding box and if the player hasn't been hit by this laser instance yet
             if not laser.hit_player and \
                     (player.x - player.width / 2 < laser.end_pos[0] < player.x + player.width / 2 and
@@ -1108,36 +2896,92 @@ def run_game(level_num):
 
                 if player.shield_active:
                     # Laser drains shield
-                    player.shield_meter -= GAME_SETTINGS['BOSS_LASER_SHIELD_DRAIN']
+                    player.shield_meter -= settings.boss_laser_shield_drain
                     if player.shield_meter <= 0:
                         player.shield_meter = 0
                         player.shield_active = False
                 else:
                     # Laser damages player health
-                    player.health -= GAME_SETTINGS['BOSS_LASER_DAMAGE']
+                    player.health -= settings.boss_laser_damage
+                    self.damage_taken += settings.boss_laser_damage
 
         # --- Collision Detection (Player vs Drops) ---
-        for drop in drops[:]:
-            distance = math.sqrt((player.x - drop.x) ** 2 + (player.y - drop.y) ** 2)
-            if distance < player.width:
+        drop_grid.clear()
+        for drop in drops:
+            drop_grid.insert_point(drop, drop.x, drop.y)
+
+        for drop in drop_grid.query_radius(player.x, player.y, player.width):
+            if not drop.done and (player.x - drop.x) ** 2 + (player.y - drop.y) ** 2 < player.width ** 2:
                 if drop.type == 'coin':
                     player.coins += 10
                 elif drop.type == 'shield':
-                    player.shield_meter = min(GAME_SETTINGS['SHIELD_METER_MAX'], player.shield_meter + (
-                            GAME_SETTINGS['SHIELD_METER_MAX'] * GAME_SETTINGS['SHIELD_REFILL_ON_PICKUP'] / 100))
-
-                drops.remove(drop)
-                if pickup_sfx: pickup_sfx.play()  # Play pickup sound
+                    player.shield_meter = min(settings.shield_meter_max, player.shield_meter + (
+                            settings.shield_meter_max * settings.shield_refill_on_pickup / 100))
+
+                drop.done = True
+                drops.retire(drop)
+                self.play_sound(pickup_sfx, 'pickups')  # Play pickup sound
+
+    def kill(self, enemy):
+        """Marks an enemy destroyed and queues its kill event, once however many hits finished it off.
+
+        Health is taken off as hits land, because the rest of the collision pass needs to know which
+        enemies are already dead (so spare bullets fly on); everything else a kill does waits for
+        resolve_events().
+        """
+        if not enemy.destroyed:
+            enemy.destroyed = True
+            self.events.append(CombatEvent('kill', enemy, enemy.x, enemy.y))
+
+    def resolve_events(self):
+        """Applies the tick's combat events in one pass.
+
+        Kills pay out score and coins (or the medic penalty), roll drops and count towards level
+        progress; kills and blasts add their explosions; the explosion sound plays once however
+        many enemies died; and the dead leave the world.
+        """
+        events = self.events
+        if not events:
+            return
+        now = self.now
+        player = self.player
+        world = self.world
+        explosions = world.explosions
+        kills = 0
+        for event in events:
+            if event.kind == 'blast':
+                explosions.add(explosion_pool.acquire(now, event.x, event.y, settings.bomb_aoe, True))
+                continue
+
+            kills += 1
+            world.remove_enemy(event.enemy)
+            enemy_type = event.enemy.kind
+            explosions.add(explosion_pool.acquire(now, event.x, event.y, 50))
+            self.score += enemy_type.score  # Negative for medics
+            player.coins += enemy_type.coins
+
+            # Roll the type's drop table (medics don't drop anything)
+            for drop_type, chance in enemy_type.drops:
+                if self.rng.random() < chance:
+                    world.drops.add(drop_pool.acquire(now, drop_type, event.x, event.y))
+            if enemy_type.regular:  # The boss and medics don't count towards level progress
+                world.destroyed += 1
+
+        if kills:
+            self.play_sound(enemy_explosion_sfx, 'explosions')
+        events.clear()
+
+    def cleanup(self):
+        """Removes finished entities, recycles enemies and checks whether the level is over."""
+        player = self.player
+        world = self.world
+        enemies = world.enemies
 
         # --- Cleanup, Level Progression, and Game Over ---
-        bullets = [b for b in bullets if 0 < b.x < SCREEN_WIDTH and 0 < b.y < SCREEN_HEIGHT]
-        enemy_bullets = [b for b in enemy_bullets if 0 < b.x < SCREEN_WIDTH and 0 < b.y < SCREEN_HEIGHT]
-        lasers = [l for l in lasers if not l.done]
-        laser_warnings = [w for w in laser_warnings if not w.done]
-
-        # Remove drops and explosions that have finished
-        drops = [d for d in drops if pygame.time.get_ticks() - d.spawn_time < GAME_SETTINGS['DROP_DESPAWN_TIME']]
-        explosions = [exp for exp in explosions if not exp.done]
+        self.bullets.cull()
+        self.enemy_bullets.cull()
+        # Remove the drops, explosions, lasers and warnings retired this tick, returning them to their pools
+        world.compact()
 
         # Enemy recycling logic and medic reward
         # Temporary list to hold enemies to be removed
@@ -1145,189 +2989,455 @@ def run_game(level_num):
         for enemy in enemies:
             # Check if enemy has gone off-screen
             if enemy.x < -enemy.width or enemy.x > SCREEN_WIDTH + enemy.width:
-                if enemy.type == 'medic_helicopter':
-                    player.coins += GAME_SETTINGS['COIN_VALUES']['medic_pass_by']
+                if enemy.kind.is_medic:
+                    player.coins += settings.coin_values['medic_pass_by']
                     enemies_to_remove.append(enemy)
-                elif enemy.type != 'boss':
+                elif enemy.kind.regular:
                     # Recycle regular enemies
                     if enemy.x < -enemy.width:
                         enemy.x = SCREEN_WIDTH + enemy.width
                     elif enemy.x > SCREEN_WIDTH + enemy.width:
                         enemy.x = -enemy.width
+                    enemy.prev_x = enemy.x  # Wrapped around; don't draw it sliding across the screen
 
         # Remove medic helicopters that have passed
         for enemy in enemies_to_remove:
-            enemies.remove(enemy)
+            world.remove_enemy(enemy)
 
         # Level Progression (Winning condition: boss defeated)
-        # Check if the boss was active and now the enemies list is empty
-        if boss_active and not enemies:
-            running = False  # Boss defeated, level won
+        # Check if the boss fight has started and now the enemies list is empty
+        if world.boss_fight and not enemies:
+            self.running = False  # Boss defeated, level won
 
         if player.health <= 0:
-            running = False
+            self.running = False
+
+    def close(self):
+        """Hands everything still on screen back to the pools."""
+        self.world.release_all()
+
+    def outcome(self):
+        """Returns 'won', 'lost', or 'running' if the level hasn't ended."""
+        if self.player.health <= 0:
+            return 'lost'
+        if not self.running:
+            return 'won'
+        return 'running'
+
+
+# --- Threaded Simulation ---
+class SessionSnapshot(SessionDrawing):
+    """A copy of everything a GameSession draws, taken after a tick and never changed afterwards.
+
+    The entities are shallow copies and the projectile arrays are copied, so the simulation can
+    go on changing (and recycling) its own objects while the snapshot is drawn on another thread.
+    """
+
+    def __init__(self, session, lag):
+        self.level = session.level
+        self.level_info = session.level_info
+        self.now = session.now
+        self.score = session.score
+        self.player = copy.copy(session.player)
+        self.bullets = session.bullets.snapshot()
+        self.enemy_bullets = session.enemy_bullets.snapshot()
+        self.enemies = [copy.copy(enemy) for enemy in session.enemies]
+        self.boss = copy.copy(session.boss)  # Only its health is read, for the boss bar
+        self.drops = [copy.copy(drop) for drop in session.drops]
+        self.explosions = [copy.copy(exp) for exp in session.explosions]
+        for item in session.lasers + session.laser_warnings:
+            item.get_overlay()  # Rendered once here rather than by every copy that gets drawn
+        self.lasers = [copy.copy(laser) for laser in session.lasers]
+        self.laser_warnings = [copy.copy(warning) for warning in session.laser_warnings]
+        self.progress_state = session.progress()
+        self.lag = lag  # ms of real time the simulation was behind when the snapshot was taken
+        self.taken_at = time.perf_counter()
+
+    def progress(self):
+        return self.progress_state
+
+    def alpha(self):
+        """Returns how far real time now is between this snapshot's tick and the next one (0 to 1)."""
+        return min((self.lag + (time.perf_counter() - self.taken_at) * 1000) / SIM_TIMESTEP, 1.0)
+
+
+class SnapshotBuffer:
+    """Double buffer handing SessionSnapshots from the simulation thread to the drawing thread.
+
+    publish() puts a new snapshot in the back slot, replacing any the reader never picked up;
+    latest() moves it to the front and returns the front snapshot. Snapshots don't change once
+    published, so the reader can draw its front one while the writer builds the next.
+    """
 
-        # --- Drawing ---
-        if level_num == 1 and level1_bg_image:
-            screen.blit(pygame.transform.scale(level1_bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT)), (0, 0))
-        elif level_num == 2 and level2_bg_image:
-            screen.blit(pygame.transform.scale(level2_bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT)), (0, 0))
-        else:
-            screen.fill(BLACK)
-
-        player.draw(screen)
-        for bullet in bullets:
-            bullet.draw(screen)
-        for enemy in enemies:
-            enemy.draw(screen)
-        for e_bullet in enemy_bullets:
-            e_bullet.draw(screen)
-        for drop in drops:
-            drop.draw(screen)
-
-        for exp in explosions:
-            exp.draw(screen)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.front = None
+        self.back = None
+
+    def publish(self, snapshot):
+        with self.lock:
+            self.back = snapshot
+
+    def latest(self):
+        """Returns the newest published snapshot (None before the first one)."""
+        with self.lock:
+            if self.back is not None:
+                self.front, self.back = self.back, None
+            return self.front
+
+
+class SimulationThread:
+    """Steps a GameSession at the fixed tick rate on a background thread.
+
+    The main thread keeps the window: it hands over input with set_input() and draws the
+    newest snapshot from `snapshots`. Anything else that changes the session (the upgrade shop)
+    must happen between pause() and resume(), which hold the lock the ticks run under.
+    """
+
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+        self.wall_clock = GameClock()
+        self.snapshots = SnapshotBuffer()
+        self.lock = threading.Lock()
+        self.tick_input = NullInput.IDLE
+        self.purchases = []
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name='simulation', daemon=True)
+
+    def start(self):
+        self.snapshots.publish(SessionSnapshot(self.session, 0.0))
+        self.thread.start()
+
+    def set_input(self, tick_input):
+        """Sets the input used for the ticks from now on."""
+        self.tick_input = tick_input
+
+    def pause(self):
+        """Waits for the current batch of ticks to finish, then holds the simulation and game time."""
+        self.lock.acquire()
+        self.wall_clock.pause()
+
+    def resume(self, purchases=()):
+        """Lets the simulation continue; purchases made meanwhile are recorded with the next tick."""
+        self.purchases += purchases
+        self.wall_clock.resume()
+        self.lock.release()
+
+    def stop(self):
+        """Stops the simulation and waits for the thread to exit."""
+        self.stopped = True
+        self.thread.join()
+
+    def run(self):
+        session = self.session
+        game_clock = session.clock
+        wall_clock = self.wall_clock
+        max_catch_up = settings.max_catch_up_ticks
+        while session.running and not self.stopped:
+            with self.lock:
+                wall_clock.scale = settings.game_speed
+                wall_clock.tick()
+                ticks_due = int((wall_clock.now - game_clock.now) // SIM_TIMESTEP)
+                if ticks_due > max_catch_up:
+                    wall_clock.now -= (ticks_due - max_catch_up) * SIM_TIMESTEP
+                    ticks_due = max_catch_up
+                for _ in range(ticks_due):
+                    game_clock.advance(SIM_TIMESTEP)
+                    step_input = self.tick_input._replace(purchases=tuple(self.purchases))
+                    self.purchases = []
+                    self.recorder.record(step_input, game_clock.now)
+                    session.step(step_input)
+                    if not session.running:
+                        break
+                if ticks_due:
+                    voices.end_frame()
+                    self.snapshots.publish(SessionSnapshot(session, wall_clock.now - game_clock.now))
+                wait = (SIM_TIMESTEP - (wall_clock.now - game_clock.now)) / wall_clock.scale
+            # Sleeping (even for 0) releases the GIL, so drawing on the main thread can run meanwhile
+            time.sleep(max(wait, 0) / 1000)
 
-        for laser in lasers:
-            laser.draw(screen)
-        for warning in laser_warnings:
-            warning.draw(screen)
 
-        # Draw HUD
-        draw_text(screen, f"Score: {score}", hud_font, YELLOW, 10, 10)
-        draw_text(screen, f"Coins: {player.coins}", hud_font, YELLOW, 10, 35)
-        draw_text(screen, f"Level: {level}", hud_font, YELLOW, 10, 60)
-        draw_text(screen, f"Health: {player.health}%", hud_font, YELLOW, 10, 85)
+def run_game(level_num):
+    """The main game loop and logic."""
+    global background_music_enabled, menu_music_playing
 
-        # Draw Shield Meter
-        shield_bar_width = 150
-        shield_bar_height = 15
-        shield_bar_x = 10
-        shield_bar_y = 110
-        pygame.draw.rect(screen, GRAY_LIGHT, (shield_bar_x, shield_bar_y, shield_bar_width, shield_bar_height),
-                         border_radius=5)
-        fill_width = (player.shield_meter / GAME_SETTINGS['SHIELD_METER_MAX']) * shield_bar_width
-        pygame.draw.rect(screen, BLUE, (shield_bar_x, shield_bar_y, fill_width, shield_bar_height), border_radius=5)
-        draw_text(screen, f"Shield: {int(player.shield_meter)}%", font, WHITE, shield_bar_x + shield_bar_width // 2,
-                  shield_bar_y + shield_bar_height // 2, centered=True)
+    # Usually already loaded in the background while the menu was showing
+    level = load_level(level_num)
+    assets.wait('sprites')
+    assets.wait(level.assets)
 
-        # Draw Progress Bar
-        progress_bar_width = 200
-        progress_bar_height = 15
-        progress_bar_x = SCREEN_WIDTH - progress_bar_width - 10
-        progress_bar_y = 10
-        pygame.draw.rect(screen, GRAY_LIGHT, (progress_bar_x, progress_bar_y, progress_bar_width, progress_bar_height),
-                         border_radius=5)
-        if total_enemies_for_level > 0:
-            fill_width = (enemies_destroyed_in_level / total_enemies_for_level) * progress_bar_width
-            if fill_width > progress_bar_width:
-                fill_width = progress_bar_width  # Don't exceed the bar length
-            pygame.draw.rect(screen, GREEN, (progress_bar_x, progress_bar_y, fill_width, progress_bar_height),
-                             border_radius=5)
-        draw_text(screen, f"Progress: {enemies_destroyed_in_level}/{total_enemies_for_level}", font, WHITE,
-                  progress_bar_x + progress_bar_width // 2, progress_bar_y + progress_bar_height // 2, centered=True)
+    # Play level music
+    if background_music_enabled:
+        music_file = globals()[level.music]
+        if music_file:
+            pygame.mixer.music.load(music_file)
+            pygame.mixer.music.play(-1)
+    menu_music_playing = False
 
-        # Boss health bar
-        if boss_active and enemies:
-            boss = enemies[0]
-            boss_bar_width = SCREEN_WIDTH - 20
-            boss_bar_height = 20
-            boss_bar_x = 10
-            boss_bar_y = SCREEN_HEIGHT - 30
-            pygame.draw.rect(screen, GRAY_LIGHT, (boss_bar_x, boss_bar_y, boss_bar_width, boss_bar_height))
-            fill_width = (boss.health / GAME_SETTINGS[f'BOSS_HEALTH_L{level}']) * boss_bar_width
-            pygame.draw.rect(screen, RED, (boss_bar_x, boss_bar_y, fill_width, boss_bar_height))
-            draw_text(screen, "BOSS", font, WHITE, SCREEN_WIDTH // 2, boss_bar_y + boss_bar_height // 2, centered=True)
+    game_clock = GameClock(time_source=None)
+    session = GameSession(level_num, game_clock)
+    player = session.player
+    recorder = InputRecorder(level_num, session.seed)
+    profiler = FrameProfiler(settings.profiler_history, settings.profiler_refresh_ms,
+                             settings.profiler_capture_frames)
+    renderer = DirtyRectRenderer() if settings.dirty_rect_rendering else None
+    if settings.threaded_simulation:
+        play_threaded(session, recorder, profiler, renderer)
+    else:
+        play(session, recorder, profiler, renderer)
 
-        pygame.display.flip()
-        clock.tick(60)
+    if profiler.profile:
+        profiler.finish_capture()
+    session.close()
+    if recording_path:
+        recorder.save(recording_path)
 
     # After the loop, check if the player won or lost
     pygame.mixer.music.stop()  # Stop the level music
     if player.health <= 0:
-        game_over_screen(score, player.coins, player.upgrades)
+        game_over_screen(session.score, player.coins, player.upgrades)
     else:
-        game_over_screen(score, player.coins, player.upgrades, level_completed=level)
-
-
-if __name__ == '__main__':
-    main_menu()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        game_over_screen(session.score, player.coins, player.upgrades, level_completed=session.level)
+
+
+def draw_frame(session, alpha, profiler, renderer):
+    """Draws a frame of a session (or a SessionSnapshot of one) and the profiler overlay, then shows it."""
+    if renderer:
+        # The HUD layer is composited inside renderer.draw, so it is counted as 'draw' here
+        renderer.draw(screen, session, alpha)
+        profiler.mark('draw')
+        renderer.add(profiler.draw(screen, session, clock.get_fps()))
+        profiler.mark('hud')
+        renderer.present()
+    else:
+        session.draw_world(screen, alpha)
+        profiler.mark('draw')
+        session.draw_hud(screen)
+        profiler.draw(screen, session, clock.get_fps())
+        profiler.mark('hud')
+        pygame.display.flip()
+    profiler.mark('flip')
+
+
+def handle_profiler_key(key, profiler):
+    """Handles the profiler hotkeys: F3 shows the overlay, F4 captures a cProfile dump."""
+    if key == pygame.K_F3:
+        profiler.toggle()
+    elif key == pygame.K_F4:
+        profiler.capture()
+
+
+def play(session, recorder, profiler, renderer):
+    """Plays a level on the main thread, simulating and drawing in turn."""
+    # The simulation advances the session's clock in fixed ticks until it has caught up with
+    # wall_clock, the real time played so far (scaled by GAME_SPEED), and frames are drawn in
+    # between as often as allowed
+    game_clock = session.clock
+    wall_clock = GameClock()
+    max_catch_up = settings.max_catch_up_ticks
+    watcher = SettingsWatcher()
+    purchases = []
+
+    while session.running:
+        profiler.begin_frame()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_u:
+                    # Game time stands still while shopping, so timers don't all expire at once on return
+                    wall_clock.pause()
+                    purchases += upgrade_shop(session.player)
+                    wall_clock.resume()
+                    profiler.begin_frame()  # Don't count the time spent in the shop
+                    if renderer:
+                        renderer.invalidate()
+                else:
+                    handle_profiler_key(event.key, profiler)
+
+        # --- Input Handling and Simulation ---
+        new_settings = watcher.poll()
+        if new_settings is not None:
+            recorder.record_settings(new_settings)
+            use_settings(new_settings)
+        wall_clock.scale = settings.game_speed
+        wall_clock.tick()
+        tick_input = poll_input()
+        ticks_due = int((wall_clock.now - game_clock.now) // SIM_TIMESTEP)
+        if ticks_due > max_catch_up:
+            # Too far behind to catch up without stalling; drop the excess time instead
+            wall_clock.now -= (ticks_due - max_catch_up) * SIM_TIMESTEP
+            ticks_due = max_catch_up
+        for _ in range(ticks_due):
+            game_clock.advance(SIM_TIMESTEP)
+            step_input = tick_input._replace(purchases=tuple(purchases))
+            purchases = []
+            recorder.record(step_input, game_clock.now)
+            session.step(step_input, profiler.mark)
+            if not session.running:
+                break
+        voices.end_frame()
 
+        # --- Drawing ---
+        # How far real time is past the last tick, for drawing moving entities between ticks
+        alpha = min((wall_clock.now - game_clock.now) / SIM_TIMESTEP, 1.0)
+        draw_frame(session, alpha, profiler, renderer)
+        clock.tick(settings.render_fps_cap)
+        profiler.end_frame()
+
+
+def play_threaded(session, recorder, profiler, renderer):
+    """Plays a level with the simulation on a SimulationThread.
+
+    This (main) thread handles the event queue and draws the newest snapshot, so drawing a
+    frame overlaps the next ticks instead of delaying them. The profiler only times this
+    thread's phases; the simulation phases show as zero.
+    """
+    sim = SimulationThread(session, recorder)
+    watcher = SettingsWatcher()
+    sim.start()
+    while session.running:
+        profiler.begin_frame()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                sim.stop()
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_u:
+                    sim.pause()
+                    sim.resume(upgrade_shop(session.player))
+                    profiler.begin_frame()  # Don't count the time spent in the shop
+                    if renderer:
+                        renderer.invalidate()
+                else:
+                    handle_profiler_key(event.key, profiler)
+        sim.set_input(poll_input())
+        new_settings = watcher.poll()
+        if new_settings is not None:
+            sim.pause()  # Swapped between ticks, like a shop visit
+            recorder.record_settings(new_settings)
+            use_settings(new_settings)
+            sim.resume()
+        profiler.mark('input')
+
+        snapshot = sim.snapshots.latest()
+        draw_frame(snapshot, snapshot.alpha(), profiler, renderer)
+        clock.tick(settings.render_fps_cap)
+        profiler.end_frame()
+    sim.stop()
+
+
+def session_result(session, ticks):
+    """Summarizes a finished (or abandoned) session for headless runs and replays."""
+    outcome = session.outcome()
+    return {'outcome': 'timeout' if outcome == 'running' else outcome, 'score': session.score,
+            'coins': session.player.coins, 'ticks': ticks, 'seed': session.seed,
+            'time_to_boss': session.boss_spawn_time, 'damage_taken': session.damage_taken,
+            'upgrades': [upgrade_id for upgrade_id, owned in session.player.upgrades.items() if owned]}
+
+
+def run_headless(level_num, input_source=None, max_ticks=HEADLESS_MAX_TICKS, timestep=HEADLESS_TIMESTEP, seed=None):
+    """Runs one level without drawing or audio, stepping the simulation at a fixed timestep
+    as fast as the CPU allows.
+
+    input_source supplies a TickInput for each tick (NullInput if not given). Returns the
+    final score, coins, outcome ('won', 'lost' or 'timeout'), the number of ticks run and the seed.
+    """
+    source = input_source if input_source is not None else NullInput()
+    game_clock = GameClock(time_source=None)
+    session = GameSession(level_num, game_clock, headless=True, seed=seed)
+    ticks = 0
+    while session.running and ticks < max_ticks:
+        ticks += 1
+        game_clock.advance(timestep)
+        session.step(source.poll(session))
+    session.close()
+    return session_result(session, ticks)
+
+
+def replay_session(path, render=True):
+    """Re-runs a recorded level from its input log as fast as the simulation allows.
+
+    The session gets the recorded seed and each tick the recorded game time, so it plays out
+    exactly as it did live. With render=True every tick is drawn (without a frame cap), which
+    makes it possible to profile the drawing of a reported session; otherwise it runs headless.
+    The recorded settings are used while it runs, whatever the settings file now says.
+    """
+    replay = ReplayInput(path)
+    if render:
+        load_level(replay.level)  # Adds the level's background and music for load_all() to load
+        assets.load_all()
+    current_settings = settings
+    if 0 in replay.settings:
+        use_settings(replay.settings[0])
+    game_clock = GameClock(time_source=None)
+    session = GameSession(replay.level, game_clock, headless=True, seed=replay.seed)
+    ticks = 0
+    while session.running and ticks < len(replay):
+        if ticks and ticks in replay.settings:
+            use_settings(replay.settings[ticks])  # Reloaded during the live session
+        game_clock.now = replay.times[ticks]
+        tick_input = replay.poll(session)
+        for upgrade_id in tick_input.purchases:
+            buy_upgrade(session.player, upgrade_id)
+        session.step(tick_input)
+        ticks += 1
+
+        if render:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+            session.draw_world(screen)
+            session.draw_hud(screen)
+            pygame.display.flip()
+    session.close()
+    use_settings(current_settings)
+    return session_result(session, ticks)
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Loser, a side-scrolling tank shooter.")
+    parser.add_argument('--headless', action='store_true', help="simulate without a window or audio")
+    parser.add_argument('--level', type=int, default=1, help="level to simulate in headless mode")
+    parser.add_argument('--ticks', type=int, default=HEADLESS_MAX_TICKS, help="give up a headless run after this many ticks")
+    parser.add_argument('--seed', type=int, help="random seed for a headless run")
+    parser.add_argument('--record', default=recording_path, help="file each played level's input is recorded to")
+    parser.add_argument('--replay', help="replay a recorded session (without drawing if --headless)")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="only redraw changed areas of the window (faster on software-rendered displays)")
+    parser.add_argument('--threaded', action='store_true',
+                        help="run the simulation on its own thread, overlapping it with drawing")
+    parser.add_argument('--fps', type=int, help="draw at most this many frames per second (0 for no limit)")
+    parser.add_argument('--vsync', action='store_true', help="sync drawing to the display's refresh rate")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="print the time to the first frame and to load each asset group, then exit")
+    args = parser.parse_args()
+    startup_report = args.startup_time
+    if args.dirty_rects:
+        settings_overrides['DIRTY_RECT_RENDERING'] = True
+    if args.threaded:
+        settings_overrides['THREADED_SIMULATION'] = True
+    if args.vsync:
+        settings_overrides['VSYNC'] = True
+    if args.fps is not None:
+        settings_overrides['RENDER_FPS_CAP'] = args.fps
+    try:
+        use_settings(load_settings())
+    except ValueError as e:
+        sys.exit(f"Invalid settings: {e}")
+    if args.vsync:
+        screen = open_window()
+    try:
+        if args.replay:
+            print(replay_session(args.replay, render=not args.headless))
+        elif args.headless:
+            print(run_headless(args.level, max_ticks=args.ticks, seed=args.seed))
+        else:
+            recording_path = args.record
+            main_menu()
+    except LevelFileError as e:
+        sys.exit(str(e))